@@ -0,0 +1,5 @@
+# Shared helpers for the heroku-review-envs GitHub Actions.
+#
+# This package is baked into the trrimages/actions:python base image (see
+# python-action/Dockerfile). The action scripts live in review_envs.commands and
+# run through the review-envs entrypoint in review_envs.cli.
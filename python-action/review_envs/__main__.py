@@ -0,0 +1,7 @@
+# python3 -m review_envs <command> ...
+
+import sys
+
+from review_envs import cli
+
+sys.exit(cli.main())
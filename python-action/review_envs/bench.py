@@ -0,0 +1,79 @@
+# Cold-start benchmark for the review-envs commands.
+#
+#   python3 -m review_envs.bench [--runs 10] [--importtime] [--output bench.json]
+#
+# Every sample is a fresh interpreter, as in a workflow step. For each command
+# it imports exactly what the command imports at the top of its module (read
+# with ast, so no command actually runs) and reports the median wall time next
+# to a bare interpreter start. --importtime adds the slowest imports from
+# python -X importtime, and --output writes the numbers as JSON so they can be
+# compared between builds.
+
+import argparse
+import ast
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from review_envs import cli
+
+def command_imports( module_name ):
+    # the import statements at the top level of the command's module
+    with open(importlib.util.find_spec(module_name).origin, 'r', encoding='utf-8') as module_file:
+        tree = ast.parse(module_file.read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            lines.append( 'import ' + ', '.join( x.name for x in node.names ) )
+        elif isinstance(node, ast.ImportFrom):
+            lines.append( 'from %s import %s' % ( node.module, ', '.join( x.name for x in node.names ) ) )
+    return lines
+
+def sample( code, runs ):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run( [ sys.executable, '-c', code ], check=True )
+        times.append( time.perf_counter() - start )
+    return statistics.median(times) * 1000
+
+def slowest_imports( code, count ):
+    # python -X importtime writes "import time: self | cumulative | name" to stderr
+    result = subprocess.run( [ sys.executable, '-X', 'importtime', '-c', code ], check=True, stderr=subprocess.PIPE, universal_newlines=True )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append( ( int(parts[1]), parts[2].rstrip() ) )
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start benchmark for the review-envs commands.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--importtime', action='store_true', help='show the slowest imports of each command')
+    parser.add_argument('--output', help='write the results as JSON')
+    options = parser.parse_args()
+
+    targets = [ ( 'python', 'pass' ), ( 'review-envs', 'import review_envs.cli' ) ]
+    for command, module_name in cli.COMMANDS.items():
+        targets.append( ( command, '\n'.join(command_imports( module_name )) ) )
+
+    results = {}
+    print( "%-14s %10s" % ('startup', 'median ms') )
+    for name, code in targets:
+        results[name] = round( sample( code, options.runs ), 1 )
+        print( "%-14s %10.1f" % (name, results[name]) )
+        if options.importtime and name != 'python':
+            for cumulative, module in slowest_imports( code, 5 ):
+                print( "%14s %10.1f %s" % ('', cumulative / 1000.0, module) )
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump({ 'python': sys.version.split()[0], 'runs': options.runs, 'median_ms': results }, output_file, indent=2)
+        print( "Wrote %s" % options.output )
+
+if __name__ == '__main__':
+    main()
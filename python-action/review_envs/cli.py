@@ -0,0 +1,61 @@
+# review-envs <command> [KEY=VALUE ...] - one entrypoint for every action.
+#
+# Only the chosen command's module is loaded, so e.g. okta-add never imports
+# the GitHub or Heroku helpers.
+
+import os
+import runpy
+import sys
+import threading
+
+COMMANDS = {
+    'create': 'review_envs.commands.create',
+    'destroy': 'review_envs.commands.destroy',
+    'addon': 'review_envs.commands.addon',
+    'config': 'review_envs.commands.config',
+    'okta-add': 'review_envs.commands.okta_add',
+    'okta-remove': 'review_envs.commands.okta_remove',
+    'reap': 'review_envs.commands.reap',
+    'fanout': 'review_envs.commands.fanout',
+    'pool': 'review_envs.commands.pool',
+    'serve': 'review_envs.server'
+}
+
+# the inputs of the command running in this thread, when serve runs several
+# commands at once
+_job = threading.local()
+
+def usage():
+    return "usage: review-envs {%s} [KEY=VALUE ...]" % '|'.join(COMMANDS)
+
+def environ():
+    # the environment the running command should read instead of os.environ
+    return getattr(_job, 'environ', os.environ)
+
+def argv():
+    # the arguments the running command should read instead of sys.argv
+    return getattr(_job, 'argv', sys.argv)
+
+def run( command, argv, environ=None ):
+    # Runs a command in this thread. The scripts read their KEY=VALUE
+    # arguments through argv() and their environment through environ(), so
+    # with `environ` - variables laid over os.environ - several threads can
+    # each run a command of their own.
+    job_argv = [ 'review-envs ' + command ] + list(argv)
+    if environ is None:
+        sys.argv = job_argv
+    else:
+        _job.argv = job_argv
+        _job.environ = dict(os.environ, **environ)
+    try:
+        runpy.run_module( COMMANDS[command], run_name='__main__', alter_sys=False )
+    finally:
+        _job.__dict__.clear()
+
+def main( argv=None ):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print( usage() )
+        return 2
+    run( argv[0], argv[1:] )
+    return 0
@@ -0,0 +1,197 @@
+# Pooled HTTP client shared by all of the action scripts.
+#
+# Every API host (api.heroku.com, api.github.com, the Okta org) gets one
+# keep-alive requests.Session, so a run that makes hundreds of calls pays for
+# the TLS handshake once per host instead of once per call. Idempotent calls
+# are retried on connection errors and 5xx gateway responses, and every call
+# gets a default timeout so a stuck socket can't hang a workflow step. All
+# calls go through the per-host rate limiter in review_envs.ratelimit, and a
+# throttled response pauses that host for every thread, not just the caller.
+# GETs made with cache=... can be answered from the on-disk cache in
+# review_envs.httpcache.
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from review_envs import httpcache
+from review_envs import log
+from review_envs import ratelimit
+from review_envs import trace
+
+# can be pointed elsewhere, e.g. at the local stand-in in review_envs.fakeapi
+API_URL_HEROKU = os.environ.get('API_URL_HEROKU', 'https://api.heroku.com').rstrip('/')
+API_URL_GITHUB = os.environ.get('API_URL_GITHUB', 'https://api.github.com').rstrip('/')
+
+USER_AGENT = 'Heroku GitHub Actions Provider by TheRealReal'
+
+# (connect, read) seconds - can be overridden per call with timeout=...
+DEFAULT_TIMEOUT = (5, 60)
+
+# connection pool sizing - large enough for the concurrent worker pools
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# urllib3 only retries connection and read errors - every response, whatever
+# its status, comes back to _request() so it can be seen by the rate limiter
+RETRY_CONNECT = 3
+
+# One budget for retrying responses. Throttled calls (429, or GitHub's 403
+# with no budget left) are retried for any method, since the API didn't act
+# on them. 5xx gateway responses are retried for idempotent methods only.
+RETRIES = 5
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = ( 500, 502, 503, 504 )
+IDEMPOTENT_METHODS = ( 'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS' )
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Headers ######################################################################
+
+def heroku_headers( token, variant='review-apps', page_size=None ):
+    headers = {
+        'Accept': 'application/vnd.heroku+json; version=3.%s' % variant,
+        'Authorization': 'Bearer %s' % token,
+        'User-Agent': USER_AGENT,
+        'Content-Type': 'application/json'
+        }
+    if page_size:
+        headers['Range'] = 'id ..; max=%d;' % page_size
+    return headers
+
+def github_headers( token ):
+    return {
+        'Accept': 'application/vnd.github.v3+json',
+        'Authorization': 'token %s' % token,
+        'User-Agent': USER_AGENT,
+        'Content-Type': 'application/json'
+        }
+
+def okta_headers( token ):
+    return {
+        'Accept': 'application/json',
+        'Authorization': 'SSWS %s' % token,
+        'User-Agent': USER_AGENT,
+        'Content-Type': 'application/json'
+        }
+
+# Sessions #####################################################################
+
+def _host_key( url ):
+    parts = urllib.parse.urlsplit(url)
+    return '%s://%s' % ( parts.scheme, parts.netloc )
+
+def _new_session():
+    retry = Retry(
+        total=RETRY_CONNECT,
+        connect=RETRY_CONNECT,
+        read=RETRY_CONNECT,
+        status=0,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(),
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'User-Agent': USER_AGENT
+    })
+    return session
+
+def session_for( url ):
+    key = _host_key(url)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _new_session()
+            _sessions[key] = session
+        return session
+
+def close():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# Requests #####################################################################
+
+def _retries( response ):
+    # connection retries urllib3 made under the hood for this response
+    retries = getattr(response.raw, 'retries', None)
+    return len(getattr(retries, 'history', None) or ())
+
+def request( method, url, cache=None, **kwargs ):
+    # cache=True, or a TTL in seconds, marks a GET of slow-changing data as
+    # safe to answer from the on-disk cache when HTTP_CACHE_DIR is set
+    if cache is not None and cache is not False and method == 'GET' and httpcache.ENABLED:
+        headers = kwargs.pop('headers', None)
+        if 'If-None-Match' not in (headers or {}):
+            return httpcache.get( lambda x: _request(method, url, headers=x, **kwargs), url, headers, cache )
+        kwargs['headers'] = headers
+    return _request(method, url, **kwargs)
+
+def _request( method, url, **kwargs ):
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    session = session_for(url)
+    bucket = ratelimit.bucket_for(url)
+    started = time.monotonic()
+    for attempt in range(RETRIES + 1):
+        bucket.acquire()
+        r = session.request(method, url, **kwargs)
+        ratelimit.observe(bucket, r)
+        retry_after = ratelimit.retry_after(r)
+        failed = retry_after is None and r.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+        if ( retry_after is None and not failed ) or attempt == RETRIES:
+            if trace.ENABLED:
+                trace.record( method, url, r.status_code, len(r.content), time.monotonic() - started, attempt + _retries(r) )
+            return r
+        if failed:
+            # a server error is this call's problem - back off in this thread only
+            time.sleep( RETRY_BACKOFF * 2 ** attempt )
+            continue
+        # throttling is the whole host's problem - every thread waits it out
+        log.warning( "Rate limited on %s %s - retrying in %.0fs..." % (method, _host_key(url), retry_after) )
+        bucket.pause(retry_after)
+
+def get( url, **kwargs ):
+    return request('GET', url, **kwargs)
+
+def post( url, **kwargs ):
+    return request('POST', url, **kwargs)
+
+def put( url, **kwargs ):
+    return request('PUT', url, **kwargs)
+
+def patch( url, **kwargs ):
+    return request('PATCH', url, **kwargs)
+
+def delete( url, **kwargs ):
+    return request('DELETE', url, **kwargs)
+
+def get_json_if_changed( url, state, headers=None, **kwargs ):
+    # Conditional GET for polling. `state` is a dict the caller keeps between
+    # polls - it holds the last ETag and body, and a 304 answers with the body
+    # we already have. Returns (body, changed).
+    headers = dict(headers or {})
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    r = get( url, headers=headers, **kwargs )
+    if r.status_code == 304 and 'body' in state:
+        return state['body'], False
+    body = json.loads(r.text)
+    if r.status_code == 200:
+        state['etag'] = r.headers.get('ETag')
+        state['body'] = body
+    return body, True
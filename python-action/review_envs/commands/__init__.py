@@ -0,0 +1,2 @@
+# The action scripts, one module per review-envs command. Each runs top to
+# bottom when executed through review_envs.cli - importing one directly runs it.
@@ -0,0 +1,367 @@
+# review-envs addon: provisions addons and attaches them to the environment apps.
+# Run by the heroku-addon-create action.
+
+import concurrent.futures
+import json
+import sys
+import time
+
+from review_envs import cli
+from review_envs import client
+from review_envs import github
+from review_envs import log
+from review_envs import trace
+from review_envs import wait
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# some constants
+NEUTRAL_EXIT_CODE = 78
+ATTACH_WORKERS = 8
+ADDON_WORKERS = 4
+
+# tokens
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+GITHUB_TOKEN = environ['GITHUB_TOKEN']
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+HEADERS_HEROKU_REVIEW_PIPELINES = client.heroku_headers( HEROKU_TOKEN, 'pipelines' )
+
+API_URL_HEROKU = client.API_URL_HEROKU
+
+# basic headers for communicating with the GitHub API
+HEADERS_GITHUB = client.github_headers( GITHUB_TOKEN )
+API_URL_GITHUB = client.API_URL_GITHUB
+
+# Heroku Related Functions #####################################################
+
+def get_review_app_by_branch( pipeline_id, branch_name ):
+    r = client.get(API_URL_HEROKU+'/pipelines/'+pipeline_id+'/review-apps', headers=HEADERS_HEROKU)
+    reviewapps = json.loads(r.text)
+    reviewapp = next((x for x in reviewapps if x['branch'] == branch_name), None)
+    try:
+        if reviewapp is not None and 'app' in reviewapp and 'id' in reviewapp['app']:
+            return reviewapp
+    except:
+        pass
+    return None
+
+def get_app_by_name( app_name ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_name, headers=HEADERS_HEROKU)
+    app = json.loads(r.text)
+    try:
+        if app is not None and 'id' in app:
+            return app
+    except:
+        pass
+    return None
+
+def create_addon( app_name, addon_name, addon_plan, addon_config=None ):
+    payload = {
+        'plan': addon_plan,
+        'attachment': {
+            'name': addon_name
+        }
+    }
+    if addon_config:
+        payload['config'] = addon_config
+    r = client.post(API_URL_HEROKU+'/apps/'+app_name+'/addons', headers=HEADERS_HEROKU_REVIEW_PIPELINES, data=json.dumps(payload))
+    return json.loads(r.text)
+
+def get_addon( addon_id ):
+    r = client.get(API_URL_HEROKU+'/addons/'+addon_id, headers=HEADERS_HEROKU_REVIEW_PIPELINES)
+    return json.loads(r.text)
+
+def attach_addon( app_name, addon_name, addon_id ):
+    payload = {
+        'addon': addon_id,
+        'app': app_name,
+        'name': addon_name
+    }
+    r = client.post(API_URL_HEROKU+'/addon-attachments', headers=HEADERS_HEROKU_REVIEW_PIPELINES, data=json.dumps(payload))
+    return json.loads(r.text)
+
+def get_app_addon_attachments( app_name ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_name+'/addon-attachments', headers=HEADERS_HEROKU_REVIEW_PIPELINES)
+    addons = json.loads(r.text)
+    return addons
+
+def attach_addon_if_missing( app_name, addon, attachment_name ):
+    # Attaches the addon unless the app already has an attachment by that name,
+    # whichever addon it points at (e.g. the app's own DATABASE). Returns the
+    # attachment, or None when the name is taken.
+    existing = get_app_addon_attachments( app_name )
+    if not isinstance(existing, list):
+        return existing
+    if any( type(x) is dict and x.get('name') == attachment_name for x in existing ):
+        return None
+    return attach_addon( app_name, attachment_name, addon['id'] )
+
+def attach_addon_to_apps( addon, attachment_name, app_names ):
+    # Checks and attaches the addon to each app in parallel. Returns the app
+    # names we failed to attach to.
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ATTACH_WORKERS) as pool:
+        attach = trace.propagate( attach_addon_if_missing )
+        futures = { pool.submit( attach, app_name, addon, attachment_name ): app_name for app_name in app_names }
+        for future in concurrent.futures.as_completed(futures):
+            app_name = futures[future]
+            try:
+                attachment = future.result()
+            except Exception as ex:
+                log.warning(ex)
+                attachment = {}
+            if attachment is None:
+                log.info("App %s already has an addon attached as %s." % (app_name, attachment_name))
+            elif 'name' in attachment:
+                log.info("Attached addon %s to %s as %s." % (addon['name'], app_name, attachment_name))
+            else:
+                log.warning("Couldn't attach addon %s to %s as %s: %s" % (addon['name'], app_name, attachment_name, log.summary(attachment)))
+                failed.append(app_name)
+    return failed
+
+# GitHub Related Functions #####################################################
+
+def get_latest_commit_for_branch( repo, branch_name ):
+    r = client.get(API_URL_GITHUB+'/repos/'+repo+'/branches/'+branch_name, headers=HEADERS_GITHUB)
+    branch = json.loads(r.text)
+    try:
+        return branch['commit']['sha']
+    except:
+        return None
+
+def add_pr_comment( repo, pr_id, message):
+    payload = {
+        'body': message
+    }
+    r = client.post(API_URL_GITHUB+'/repos/'+repo+'/issues/'+str(pr_id)+'/comments', headers=HEADERS_GITHUB, data=json.dumps(payload))
+    comment = json.loads(r.text)
+    return comment
+
+
+# Non-API-Related Functions ####################################################
+
+def get_app_name( svc_origin, svc_name, pr_num, prefix ):
+    if svc_origin != svc_name:
+        # if related app, we append the app name
+        name = "%s-%s-pr-%s-%s" % ( prefix, svc_origin, pr_num, svc_name )
+    else:
+        # if this is the originating app, just name it like vanilla review apps
+        name = "%s-%s-pr-%s" % ( prefix, svc_origin, pr_num )
+    # truncate to 30 chars for Heroku
+    return name[:30]
+
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# get the github event json
+if 'GITHUB_EVENT_PATH' in environ:
+    EVENT_FILE = environ['GITHUB_EVENT_PATH']
+    with open(EVENT_FILE, 'r', encoding="utf-8") as eventfile:
+        GH_EVENT = json.load(eventfile)
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'APP_PREFIX',
+    'APP_ORIGIN',
+    'APP_NAME',
+    'RELATED_APPS',
+    'ADDON_PLAN',
+    'ADDON_NAME',
+    'ADDONS',
+    'WAIT_TIMEOUT',
+    'REQUIRE_LABEL'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+# determine the app_short_name - short name that references the type of service
+app_short_name = args['APP_NAME']
+log.info("Service Name: "+app_short_name)
+
+# APP_ORIGIN is the originating app. Fill in the value of this var just for ease of use.
+app_origin = app_short_name
+if 'APP_ORIGIN' in args:
+    app_origin = args['APP_ORIGIN']
+    # if required transform origin repo name into origin app name
+    if app_origin == "real-server":
+        app_origin = "web"
+    if app_origin == "inventory-service":
+        app_origin = "inventory"
+log.info("Originating Service: "+app_origin)
+
+# pull branch name from the GITHUB_REF
+try:
+    branch_origin = GH_EVENT['pull_request']['head']['ref'] # this has been more reliable
+except:
+    branch_origin = environ['GITHUB_REF'][11:] # this is sometimes wrong
+commit_sha = environ['GITHUB_SHA']
+origin_commit_sha = commit_sha
+
+# set the app name prefix properly
+app_prefix = args['APP_PREFIX']
+
+# we always need to know the originating repo:
+repo_origin = environ['GITHUB_REPOSITORY']
+
+# ADDONS lists several addons to provision in parallel, separated by |, each as
+# NAME%PLAN with optional %key=value config entries, for example:
+#   KAFKA%heroku-kafka:basic-0|DATABASE%heroku-postgresql:hobby-dev%version=11
+# ADDON_NAME/ADDON_PLAN still work for a single addon.
+addon_specs = []
+if 'ADDONS' in args:
+    for spec in args['ADDONS'].split('|'):
+        if not spec:
+            continue
+        parts = spec.split('%')
+        if len(parts) < 2:
+            sys.exit("Couldn't parse addon %s - expected NAME%%PLAN[%%key=value...]" % spec)
+        config = dict( x.split('=', 1) for x in parts[2:] if '=' in x )
+        addon_specs.append( (parts[0], parts[1], config) )
+else:
+    addon_specs.append( (args['ADDON_NAME'], args['ADDON_PLAN'], None) )
+log.info("Addons: " + ', '.join( "%s (%s)" % (x[0], x[1]) for x in addon_specs ))
+
+# how long to wait for the addons to finish provisioning, in seconds
+wait_timeout = int(args['WAIT_TIMEOUT']) if 'WAIT_TIMEOUT' in args else wait.DEFAULT_DEADLINE
+
+# Require a pull request label to be present
+require_label = args['REQUIRE_LABEL'] if 'REQUIRE_LABEL' in args.keys() else False
+
+# we are always deploying this using information from the origin app
+repo = repo_origin
+branch = branch_origin
+
+github_org = repo.split('/')[0]
+log.info("GitHub Org: "+github_org)
+log.info("Repo: "+repo)
+log.info("Branch to deploy: "+branch)
+
+# DETERMINE THE APP NAME #######################################################
+
+try:
+    # we expect that the event payload has a pull_request object at the first level
+    pr = GH_EVENT['pull_request']
+except:
+    try:
+        # look up the PR number for origin repo
+        pr = github.get_pr_by_branch( repo_origin, branch_origin, HEADERS_GITHUB )
+    except Exception as ex:
+        log.warning(ex)
+        sys.exit("Couldn't find a PR for this branch - " + repo_origin + '@' + branch_origin)
+    if pr is None:
+        sys.exit("Couldn't find a PR for this branch - " + repo_origin + '@' + branch_origin)
+
+pr_num = pr['number']
+pr_labels = [x['name'] for x in pr['labels']]
+pr_status = pr['state']
+log.info("Found Pull Request: \"" + pr['title'] + "\" id: " + str(pr_num))
+
+# check required PR label
+log.info("Detected Labels: " + ', '.join(pr_labels))
+if require_label:
+    log.info("Required Labels: " + require_label)
+    if require_label not in pr_labels:
+        log.info("To spin up this add-on, label your pr with "+require_label)
+        sys.exit( NEUTRAL_EXIT_CODE )
+else:
+    log.info("Skipping label check")
+
+# determine the app_name
+app_name = get_app_name( app_origin, app_short_name, pr_num, app_prefix )
+
+log.info("App Name: "+app_name)
+
+# START CREATING/DEPLOYING #####################################################
+
+def provision_addon( addon_name, addon_plan, addon_config, existing_attachments, attach_app_names ):
+    # Creates one addon on the originating app unless it's already attached,
+    # attaches it to the related apps and waits until Heroku has provisioned
+    # it. Returns an error message, or None when the addon is ready.
+    start = time.monotonic()
+    addon = next((x['addon'] for x in existing_attachments if x['name'] == addon_name), None)
+    if addon:
+        log.info("Addon %s (%s) has already been added to %s as %s." % (addon['name'], addon_plan, app_name, addon_name ))
+    else:
+        log.info("Creating an addon plan = %s for app %s as %s..." % ( addon_plan, app_name, addon_name ))
+        addon = create_addon( app_name, addon_name, addon_plan, addon_config )
+        log.info("Addon: %s", log.lazy_summary(addon))
+        log.debug("%s", log.lazy_json(addon))
+        if 'name' not in addon:
+            return "Couldn't create the addon %s (%s): %s" % (addon_name, addon_plan, log.summary(addon))
+
+    if attach_app_names:
+        log.info("Attaching %s (%s) addon as %s to multiple apps: %s" % (addon['name'], addon_plan, addon_name, ','.join(attach_app_names)))
+        failed = attach_addon_to_apps( addon, addon_name, attach_app_names )
+        if failed:
+            return "Couldn't attach addon %s (%s) to apps %s as %s" % (addon['name'], addon_plan, ','.join(failed), addon_name )
+
+    try:
+        addon = wait.wait_for(
+            lambda: get_addon( addon['id'] ),
+            lambda x: x.get('state') != 'provisioning',
+            "addon %s" % addon['name'],
+            deadline=wait_timeout )
+    except wait.WaitTimeout as ex:
+        return str(ex)
+    if addon.get('state') != 'provisioned':
+        return "Addon %s (%s) is %s." % (addon['name'], addon_plan, addon.get('state'))
+    log.info("Addon %s (%s) is provisioned as %s after %.1fs." % (addon['name'], addon_plan, addon_name, time.monotonic() - start))
+    return None
+
+# see if there's a review app for this branch already
+app = get_app_by_name( app_name )
+
+if app is None:
+    sys.exit("Found no existing app: %s." % app_name)
+
+app_id = app['id']
+log.info("Found originating app id: " + app_id )
+
+# check existing addon attachments once for all the addons
+addon_attachments = get_app_addon_attachments( app_name )
+
+app_short_names = [ x for x in args.get('RELATED_APPS', '').split(',') if x ]
+attach_app_names = [ get_app_name( app_origin, x, pr_num, app_prefix ) for x in app_short_names ]
+
+# provisioning takes minutes for Kafka and Postgres, so the addons are created
+# and waited on side by side
+errors = []
+with concurrent.futures.ThreadPoolExecutor(max_workers=ADDON_WORKERS) as pool:
+    provision = trace.propagate( provision_addon )
+    futures = [ pool.submit( provision, name, plan, config, addon_attachments, attach_app_names ) for (name, plan, config) in addon_specs ]
+    for future in concurrent.futures.as_completed(futures):
+        try:
+            error = future.result()
+        except Exception as ex:
+            error = str(ex)
+        if error:
+            log.warning(error)
+            errors.append(error)
+
+if errors:
+    sys.exit("%d of %d addons failed." % (len(errors), len(addon_specs)))
+
+log.info("Done.")
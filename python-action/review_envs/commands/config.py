@@ -0,0 +1,134 @@
+# review-envs config: sets config vars on review environment apps.
+# Run by the heroku-config-var-set action.
+
+import concurrent.futures
+import json
+import sys
+
+from review_envs import cli
+from review_envs import client
+from review_envs import log
+from review_envs import trace
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# apps updated at the same time
+TARGET_WORKERS = 8
+
+# heroku
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+API_URL_HEROKU = client.API_URL_HEROKU
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+
+# functions
+def get_app_name( svc_origin, svc_target, pr_num, prefix ):
+    if svc_origin == svc_target:
+        app_name = "%s-%s-pr-%s" % ( prefix, svc_origin, pr_num )
+    else:
+        app_name = "%s-%s-pr-%s-%s" % ( prefix, svc_origin, pr_num, svc_target )
+
+    # truncate to 30 chars for Heroku
+    return app_name[:30]
+
+def get_config_vars( app_name ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_name+'/config-vars', headers=HEADERS_HEROKU)
+    if r.status_code != 200:
+        raise RuntimeError("There was an error reading config vars for %s - %s" % ( app_name, r.status_code ))
+    return json.loads(r.text)
+
+def set_config_vars( app_name, config_vars ):
+    r = client.patch(API_URL_HEROKU+'/apps/'+app_name+'/config-vars', headers=HEADERS_HEROKU, data=json.dumps(config_vars))
+    if r.status_code != 200:
+        raise RuntimeError("There was an error setting config vars for %s - %s" % ( app_name, r.status_code ))
+
+def update_config_vars( app_name, config_vars ):
+    # Every PATCH creates a release and restarts the dynos, so only send the
+    # vars whose values differ and skip the PATCH when nothing changed.
+    current = get_config_vars( app_name )
+    changed = { k: v for k, v in config_vars.items() if current.get(k) != v }
+    if not changed:
+        log.info("No change - Config Vars on %s are already set", app_name)
+        return
+    log.info("Start - Setting Config Vars %s on %s", ', '.join(sorted(changed)), app_name)
+    set_config_vars( app_name, changed )
+    log.info("Done  - Setting Config Vars on %s", app_name)
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'APP_PREFIX',
+    'APP_ORIGIN',
+    'APP_NAME',
+    'APP_TARGET',
+    'PR_NUM',
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+config_vars = {}
+if 'CONFIG_VARS' in args:
+    for pair in args['CONFIG_VARS'].split('|'):
+        (key, value) = pair.split('%')
+        config_vars[key] = value
+
+log.info("Config Vars: %s" % ( config_vars ))
+
+# local variables
+app_prefix = args['APP_PREFIX']
+app_origin = args['APP_ORIGIN']
+# APP_TARGET may list several apps, separated by commas
+app_targets = [ x.strip() for x in args['APP_TARGET'].split(',') if x.strip() ]
+
+# if required transform origin repo name into app name
+if app_origin == "real-server":
+    app_origin = "web"
+if app_origin == "inventory-service":
+    app_origin = "inventory"
+
+# extract the PR number from the GitHub event
+if 'GITHUB_EVENT_PATH' in environ:
+    EVENT_FILE = environ['GITHUB_EVENT_PATH']
+    with open(EVENT_FILE, 'r', encoding="utf-8") as eventfile:
+        GH_EVENT = json.load(eventfile)
+
+pr = GH_EVENT['pull_request']
+pr_num = pr['number']
+# block to be removed ends here
+
+app_names = [ get_app_name(app_origin, x, pr_num, app_prefix) for x in app_targets ]
+
+log.info("Local Vars: %s, %s, %s, %s, %s" % ( app_prefix, app_origin, ','.join(app_targets), pr_num, ','.join(app_names) ))
+
+# main script
+
+log.info("Config Vars: %s" % ( config_vars ))
+errors = []
+with concurrent.futures.ThreadPoolExecutor(max_workers=TARGET_WORKERS) as pool:
+    update = trace.propagate( update_config_vars )
+    futures = [ pool.submit( update, x, config_vars ) for x in app_names ]
+    for future in concurrent.futures.as_completed(futures):
+        try:
+            future.result()
+        except Exception as ex:
+            log.error("%s", ex)
+            errors.append(str(ex))
+
+if errors:
+    sys.exit("Couldn't set config vars on %d of %d apps." % ( len(errors), len(app_names) ))
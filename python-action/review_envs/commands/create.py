@@ -0,0 +1,969 @@
+# review-envs create: creates one app of a review environment, or all of them.
+# Run by the heroku-app-create action.
+
+import concurrent.futures
+import functools
+import json
+import random
+import re
+import secrets
+import sys
+import time
+import traceback
+
+from review_envs import cli
+from review_envs import client
+from review_envs import github
+from review_envs import heroku
+from review_envs import log
+from review_envs import trace
+from review_envs import wait
+from review_envs import warmpool
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# some constants
+APP_DOMAIN_SUFFIX = '.herokuapp.com'
+LABEL_NAME = 'review-env'
+PAGE_SIZE = 200
+ADDON_WORKERS = 4
+ENVIRONMENT_WORKERS = 6
+GRANT_PERMISSIONS = ['view', 'manage', 'deploy', 'operate']
+GRANT_WORKERS = 8
+PROMOTE_WORKERS = 8
+REFILL_WORKERS = 2
+TEAM_APPS_PAGE_SIZE = 1000
+DEFAULT_GRANT_EXCLUDE = 'devops-noreply+review-envs@therealreal.com'
+
+# terminal states we wait on while the app spawns
+REVIEW_APP_TERMINAL_STATES = ['created', 'errored', 'deleted']
+APP_SETUP_TERMINAL_STATES = ['succeeded', 'failed']
+BUILD_TERMINAL_STATES = ['succeeded', 'failed']
+
+# tokens
+GITHUB_TOKEN = environ['GITHUB_TOKEN']
+GHA_USER_TOKEN = environ['GHA_USER_TOKEN']
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+
+# invoke only when a label is added?
+REQUIRE_LABEL = (environ['USE_LABEL'].lower() == 'true') if 'USE_LABEL' in environ.keys() else False
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=PAGE_SIZE )
+HEADERS_HEROKU_REVIEW_PIPELINES = client.heroku_headers( HEROKU_TOKEN, 'pipelines', page_size=PAGE_SIZE )
+HEADERS_HEROKU_TEAM_APPS = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=TEAM_APPS_PAGE_SIZE )
+
+API_URL_HEROKU = client.API_URL_HEROKU
+
+# basic headers for communicating with the GitHub API
+HEADERS_GITHUB = client.github_headers( GHA_USER_TOKEN )
+API_URL_GITHUB = client.API_URL_GITHUB
+
+# Heroku Related Functions #####################################################
+
+
+def get_review_app_by_branch( pipeline_id, branch_name ):
+    reviewapps = heroku.paginate( API_URL_HEROKU+'/pipelines/'+pipeline_id+'/review-apps', HEADERS_HEROKU )
+    try:
+        # stops paging as soon as the branch is found
+        reviewapp = next((x for x in reviewapps if x['branch'] == branch_name), None)
+        log.debug("get_review_app_by_branch: %s", log.lazy_json(reviewapp))
+        if reviewapp is not None and 'app' in reviewapp and reviewapp['app'] is not None and 'id' in reviewapp['app']:
+            return reviewapp
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+        sys.exit("Couldn't find a Review App for this pipeline @ branch - " + pipeline_id + '@' + branch_name)
+    return None
+
+def get_review_app_by_id( id, poll_state=None ):
+    # pass the same poll_state dict on every poll to only re-download the
+    # review app once it has changed (ETag / If-None-Match)
+    poll_state = {} if poll_state is None else poll_state
+    try:
+        reviewapp, changed = client.get_json_if_changed( API_URL_HEROKU+'/review-apps/'+id, poll_state, headers=HEADERS_HEROKU )
+        if not changed:
+            log.info("Review app %s: no change." % id)
+        if reviewapp is not None and 'status' in reviewapp:
+            return reviewapp
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+    return None
+
+def get_app_setup_by_id( app_setup_id ):
+    r = client.get(API_URL_HEROKU+'/app-setups/'+app_setup_id, headers=HEADERS_HEROKU)
+    app_setup = json.loads(r.text)
+    return app_setup
+
+def delete_app_by_name( app_name ):
+    if '-pr-' not in app_name:
+        sys.exit("Tried to delete app "+app_name+" - refusing for safety's sake.")
+    r = client.delete(API_URL_HEROKU+'/apps/'+app_name, headers=HEADERS_HEROKU)
+    response = json.loads(r.text)
+    return response
+
+def get_app_by_name_or_id( app_name ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_name, headers=HEADERS_HEROKU)
+    app = json.loads(r.text)
+    log.debug("get_app_by_name_or_id: %s", log.lazy_json(app))
+    try:
+        if app is not None and 'name' in app:
+            return app
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+    return None
+
+def get_app_by_id( app_id ):
+    # the app list changes, so always revalidate - a 304 still saves the download
+    r = client.get(API_URL_HEROKU+'/apps', headers=HEADERS_HEROKU, cache=0)
+    apps = json.loads(r.text)
+    try:
+        app = next((x for x in apps if x['id'] == app_id), None)
+        if app is not None and 'id' in app:
+            return app
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+    return None
+
+def rename_app( app_id, app_name ):
+    return heroku.rename_app( app_id, app_name, HEADERS_HEROKU )
+
+@functools.lru_cache(maxsize=None)
+def get_pipelines():
+    return heroku.get_pipelines( HEADERS_HEROKU )
+
+def get_pipeline_by_name( pipeline_name ):
+    return heroku.get_pipeline_by_name( pipeline_name, HEADERS_HEROKU, get_pipelines() )
+
+def create_team_app( name, team, stack=None, region=None ):
+    payload = {'name': name, 'team': team}
+    if stack:
+        payload['stack'] = stack
+    if region:
+        payload['region'] = region
+    r = client.post(API_URL_HEROKU+'/teams/apps', headers=HEADERS_HEROKU, data=json.dumps(payload))
+    app = json.loads(r.text)
+    log.debug("%s", log.lazy_json(app))
+    if 'id' in app:
+        return app
+    else:
+        return None
+
+def create_app_setup( name, team, source_code_tgz_url, commit_sha, envs ):
+    payload = {
+        'source_blob': {
+            'url': source_code_tgz_url,
+            'version': commit_sha,
+        },
+        'app': {
+            'name': name,
+            'organization': team
+        },
+        'overrides': {
+            'env': envs
+        },
+        'skip_rollback': True
+    }
+    log.debug("%s", log.lazy_json(payload))
+    r = client.post(API_URL_HEROKU+'/app-setups', headers=HEADERS_HEROKU, data=json.dumps(payload))
+    app_setup = json.loads(r.text)
+    log.debug("%s", log.lazy_json(app_setup))
+    if 'id' in app_setup:
+        return app_setup
+    else:
+        return None
+
+def add_to_pipeline( pipeline_id, app_id, stage ):
+    payload = {
+        'app': app_id,
+        'pipeline': pipeline_id,
+        'stage': stage if stage in [ 'test',' review', 'development', 'staging', 'production' ] else 'development'
+    }
+    r = client.post(API_URL_HEROKU+'/pipeline-couplings', headers=HEADERS_HEROKU, data=json.dumps(payload))
+    coupling = json.loads(r.text)
+    log.debug("%s", log.lazy_json(coupling))
+    if 'created_at' in coupling:
+        return True
+    else:
+        return None
+
+def deploy_to_app( app_id, source_code_tgz_url, commit_sha ):
+    return heroku.deploy_to_app( app_id, source_code_tgz_url, commit_sha, HEADERS_HEROKU )
+
+def get_latest_build( app_id ):
+    headers = dict(HEADERS_HEROKU, Range='created_at ..; order=desc, max=1;')
+    r = client.get(API_URL_HEROKU+'/apps/'+app_id+'/builds', headers=headers)
+    builds = json.loads(r.text)
+    if isinstance(builds, list) and builds:
+        return builds[0]
+    return None
+
+def wait_for_build( app_id, deadline ):
+    try:
+        build = wait.wait_for(
+            lambda: get_latest_build( app_id ),
+            lambda x: x is not None and x.get('status') in BUILD_TERMINAL_STATES,
+            "build of app %s" % app_id,
+            deadline=deadline )
+    except wait.WaitTimeout as ex:
+        sys.exit(str(ex))
+    if build['status'] != 'succeeded':
+        sys.exit("Build %s of app %s %s." % (build['id'], app_id, build['status']))
+    return build
+
+def reconcile_app( app_id, repo, commit_sha, deadline ):
+    # Brings an existing app up to commit_sha, building only if the code it
+    # runs is a different commit and no build of commit_sha is under way.
+    # Returns True if a build was started.
+    deployed = heroku.get_deployed_commit( app_id, HEADERS_HEROKU )
+    if deployed == commit_sha:
+        log.info("Deployed commit %s is current - skipping the build." % commit_sha[:7])
+        return False
+    build = get_latest_build( app_id )
+    if build is not None and (build.get('source_blob') or {}).get('version') == commit_sha and build.get('status') != 'failed':
+        log.info("A build of %s is already under way." % commit_sha[:7])
+        wait_for_build( app_id, deadline )
+        return False
+    log.info("Deployed commit %s, branch head is %s - redeploying." % ((deployed or 'none')[:7], commit_sha[:7]))
+    source_code_tgz = get_download_url( repo, commit_sha, GHA_USER_TOKEN )
+    if source_code_tgz is None:
+        sys.exit("Couldn't get the redirect location for source code download.")
+    if deploy_to_app( app_id, source_code_tgz, commit_sha ) is None:
+        sys.exit("Couldn't start a build of %s on app %s." % (commit_sha[:7], app_id))
+    wait_for_build( app_id, deadline )
+    return True
+
+def find_promotable_slug( pipeline_id, commit_sha, stages ):
+    # Looks for an app of the pipeline whose current slug was built from
+    # commit_sha, stage by stage in the order given, checking the apps of each
+    # stage in parallel. Returns (slug, app id) or (None, None).
+    couplings = heroku.get_pipeline_couplings( pipeline_id, HEADERS_HEROKU )
+    for stage in stages:
+        app_ids = [ x['app']['id'] for x in couplings if x.get('stage') == stage ]
+        if not app_ids:
+            continue
+        with concurrent.futures.ThreadPoolExecutor(max_workers=PROMOTE_WORKERS) as pool:
+            get_slug = trace.propagate( heroku.get_current_slug )
+            slugs = pool.map( lambda x: get_slug( x, HEADERS_HEROKU ), app_ids )
+            for app_id, slug in zip(app_ids, slugs):
+                if slug is not None and slug.get('commit') == commit_sha:
+                    return slug, app_id
+    return None, None
+
+def create_addon( app_id, plan, attachment_name=None, config=None ):
+    payload = { 'plan': plan }
+    if attachment_name:
+        payload['attachment'] = { 'name': attachment_name }
+    if config:
+        payload['config'] = config
+    r = client.post(API_URL_HEROKU+'/apps/'+app_id+'/addons', headers=HEADERS_HEROKU, data=json.dumps(payload))
+    addon = json.loads(r.text)
+    return addon if 'id' in addon else None
+
+def get_addons_for_app( app_id ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_id+'/addons', headers=HEADERS_HEROKU)
+    return json.loads(r.text)
+
+def provision_addons( app_id, addons, deadline ):
+    # Provisions the addons of an app.json "addons" list - each a plan name or
+    # {"plan", "as", "options"} - all at once, then waits until none is still
+    # provisioning.
+    if not addons:
+        return
+    addons = [ x if isinstance(x, dict) else { 'plan': x } for x in addons ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ADDON_WORKERS) as pool:
+        create = trace.propagate( create_addon )
+        created = list(pool.map( lambda x: create( app_id, x['plan'], x.get('as'), x.get('options') ), addons ))
+    failed = [ x['plan'] for x, addon in zip(addons, created) if addon is None ]
+    if failed:
+        sys.exit("Couldn't provision addons %s on app %s." % (', '.join(failed), app_id))
+    try:
+        provisioned = wait.wait_for(
+            lambda: get_addons_for_app( app_id ),
+            lambda x: isinstance(x, list) and not any( a.get('state') == 'provisioning' for a in x ),
+            "addons of app %s" % app_id,
+            deadline=deadline )
+    except wait.WaitTimeout as ex:
+        sys.exit(str(ex))
+    failed = [ x['name'] for x in provisioned if x.get('state') != 'provisioned' ]
+    if failed:
+        sys.exit("Addons %s of app %s failed to provision." % (', '.join(failed), app_id))
+
+def update_formation( app_id, formation ):
+    # app.json "formation": {"web": {"quantity": 1, "size": "basic"}, ...}
+    updates = [ dict(v, type=k) for k, v in formation.items() ]
+    r = client.patch(API_URL_HEROKU+'/apps/'+app_id+'/formation', headers=HEADERS_HEROKU, data=json.dumps({ 'updates': updates }))
+    return r.status_code == 200
+
+def create_app_from_slug( app_name, team, slug, source_app_id, app_json, config_vars, deadline ):
+    # What an app-setup does, minus the build: create the app, set its config
+    # vars, provision the app.json addons, then release the existing slug so
+    # it boots with the addons' config vars in place. The app gets the stack
+    # the slug was compiled on and the region of the app it came from.
+    source_app = get_app_by_name_or_id( source_app_id )
+    if source_app is None:
+        sys.exit("Couldn't find app "+source_app_id)
+    stack = ( slug.get('stack') or source_app.get('stack') or {} ).get('name')
+    app = create_team_app( app_name, team, stack, ( source_app.get('region') or {} ).get('name') )
+    if app is None:
+        sys.exit("Couldn't create app "+app_name)
+    for k, v in app_json.get('env', {}).items():
+        # app.json defaults for anything the pipeline doesn't set
+        if k in config_vars:
+            continue
+        if isinstance(v, dict) and v.get('generator') == 'secret':
+            config_vars[k] = secrets.token_hex(32)
+        elif isinstance(v, dict) and 'value' in v:
+            config_vars[k] = v['value']
+        elif isinstance(v, str):
+            config_vars[k] = v
+    if set_config_vars_for_app( app['id'], config_vars ) is None:
+        sys.exit("Couldn't set the config vars of app "+app_name)
+    provision_addons( app['id'], app_json.get('addons', []), deadline )
+    release = heroku.release_slug( app['id'], slug['id'], HEADERS_HEROKU, "Promote %s" % (slug.get('commit') or slug['id'])[:7] )
+    if release is None:
+        sys.exit("Couldn't release slug %s to app %s." % (slug['id'], app_name))
+    if app_json.get('formation') and not update_formation( app['id'], app_json['formation'] ):
+        log.warning("Couldn't apply the app.json formation to app %s." % app_name)
+    return app
+
+@functools.lru_cache(maxsize=None)
+def get_team_apps( team_name ):
+    return list(heroku.list_team_apps( team_name, HEADERS_HEROKU_TEAM_APPS ))
+
+def claim_pool_app( app_short_name, app_name, commit_sha ):
+    # Claims a built pool app that runs commit_sha and returns it, or None if
+    # the pool has none. Concurrent runs try the apps in a different order.
+    pool_apps = warmpool.get_pool_apps( get_team_apps( args['HEROKU_TEAM_NAME'] ), app_prefix, app_short_name )
+    slugs = warmpool.get_pool_slugs( pool_apps, HEADERS_HEROKU )
+    ready = [ x for x in pool_apps if slugs[x['name']] and slugs[x['name']].get('commit') == commit_sha ]
+    log.info("Pool of %s: %d apps, %d ready at %s." % (app_short_name, len(pool_apps), len(ready), commit_sha[:7]))
+    random.shuffle(ready)
+    for pool_app in ready:
+        if warmpool.claim( pool_app, app_name, HEADERS_HEROKU ):
+            return pool_app
+    return None
+
+def refill_pool( app_short_name, repo, commit_sha, pipeline ):
+    # tops the pool back up to pool_size - the new apps build on Heroku's side
+    try:
+        pool_apps = warmpool.get_pool_apps( heroku.list_team_apps( args['HEROKU_TEAM_NAME'], HEADERS_HEROKU_TEAM_APPS ), app_prefix, app_short_name )
+        missing = pool_size - len(pool_apps)
+        if missing <= 0:
+            return
+        source_code_tgz = get_download_url( repo, commit_sha, GHA_USER_TOKEN )
+        if source_code_tgz is None:
+            log.info("Couldn't refill the pool of %s - no source code download.", app_short_name)
+            return
+        config_vars = get_review_app_config_vars_for_pipeline( pipeline['id'], 'review' )
+        started = warmpool.fill( missing, app_prefix, app_short_name, args['HEROKU_TEAM_NAME'], pipeline['id'], source_code_tgz, commit_sha, config_vars, HEADERS_HEROKU )
+        log.info("Refilling the pool of %s: %s", app_short_name, ', '.join(started))
+    except Exception as ex:
+        log.info("Couldn't refill the pool of %s: %s", app_short_name, ex)
+        traceback.print_exc()
+
+def get_features_for_app( app_id ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_id+'/features', headers=HEADERS_HEROKU)
+    features = json.loads(r.text)
+    try:
+        if features[0]['id'] and features[0]['doc_url']:
+            return features
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+    return None
+
+def get_config_vars_for_app( app_id ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_id+'/config-vars', headers=HEADERS_HEROKU)
+    return json.loads(r.text)
+
+def set_config_vars_for_app( app_id, config_vars ):
+    r = client.patch(API_URL_HEROKU+'/apps/'+app_id+'/config-vars', headers=HEADERS_HEROKU, data=json.dumps(config_vars))
+    result = json.loads(r.text)
+    if r.status_code != 200:
+        return None
+    for key, value in result.items():
+        if key in config_vars and result[key] != config_vars[key]:
+            return None
+    return config_vars
+
+def add_buildpacks_to_app( app_id, buildpack_urls ):
+    buildpack_changes = {
+        'updates': [{ 'buildpack': x } for x in buildpack_urls]
+    }
+    buildpack_changes['updates']
+    r = client.put(API_URL_HEROKU+'/apps/'+app_id+'/buildpack-installations', headers=HEADERS_HEROKU, data=json.dumps(buildpack_changes))
+    result = json.loads(r.text)
+    if r.status_code != 200:
+        return None
+    return result
+
+def get_review_app_config_vars_for_pipeline( pipeline_id, stage ):
+    return heroku.get_pipeline_config_vars( pipeline_id, stage, HEADERS_HEROKU_REVIEW_PIPELINES )
+
+def grant_review_app_access_to_user( app_name, email, is_collaborator ):
+    if is_collaborator:
+        payload = {
+            'permissions': GRANT_PERMISSIONS
+        }
+        r = client.patch(API_URL_HEROKU+'/teams/apps/'+app_name+'/collaborators/'+email, headers=HEADERS_HEROKU_REVIEW_PIPELINES, data=json.dumps(payload))
+    else:
+        payload = {
+            'user': email,
+            'permissions': GRANT_PERMISSIONS,
+            'silent': True
+        }
+        r = client.post(API_URL_HEROKU+'/teams/apps/'+app_name+'/collaborators', headers=HEADERS_HEROKU_REVIEW_PIPELINES, data=json.dumps(payload))
+
+    if r.status_code > 299 or r.status_code < 200:
+        if "team admin and cannot be joined on app" not in r.text:
+            log.warning("Error granting permissions to %s: %s" % ( email, r.text ))
+    return json.loads(r.text)
+
+@functools.lru_cache(maxsize=None)
+def get_team_members( team_name ):
+    return heroku.paginated_get_json_array( API_URL_HEROKU+'/teams/'+team_name+'/members', HEADERS_HEROKU_REVIEW_PIPELINES, cache=True )
+
+def get_app_collaborators( app_name ):
+    return heroku.paginated_get_json_array( API_URL_HEROKU+'/teams/apps/'+app_name+'/collaborators', HEADERS_HEROKU_REVIEW_PIPELINES )
+
+def get_missing_grants( members, collaborators, exclude ):
+    # returns [(email, is_collaborator)] for every team member that is either
+    # not on the app yet or is on it without the full set of permissions
+    current = {}
+    for x in collaborators:
+        if type(x) is dict and 'user' in x:
+            current[x['user']['email']] = set(p['name'] for p in x.get('permissions') or [])
+    wanted = set(GRANT_PERMISSIONS)
+    grants = []
+    for member in members:
+        email = member['email']
+        if email in exclude or member.get('role') == 'admin':
+            # team admins already have access and cannot be joined on the app
+            continue
+        if email not in current:
+            grants.append( (email, False) )
+        elif not wanted.issubset(current[email]):
+            grants.append( (email, True) )
+    return grants
+
+def grant_review_app_access_to_team( app_name, team_name, exclude ):
+    # list the app's collaborators once and only send the grants that differ,
+    # spread over a small worker pool
+    members = get_team_members( team_name )
+    collaborators = get_app_collaborators( app_name )
+    grants = get_missing_grants( members, collaborators, exclude )
+    log.info( "Found %s team members, %s of them need access granted." % ( len(members), len(grants) ) )
+    if not grants:
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=GRANT_WORKERS) as pool:
+        grant = trace.propagate( grant_review_app_access_to_user )
+        futures = [ pool.submit( grant, app_name, email, is_collaborator ) for (email, is_collaborator) in grants ]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as ex:
+                log.warning(ex)
+                traceback.print_exc()
+
+# GitHub Related Functions #####################################################
+
+def get_download_url( repo, branch, token ):
+    return github.get_download_url( repo, branch, token )
+
+def get_latest_commit_for_branch( repo, branch_name ):
+    return github.get_branch_head( repo, branch_name, HEADERS_GITHUB )
+
+def get_app_json( repo, commit_sha ):
+    # the app.json at the commit, {} if the repo doesn't have one
+    app_json = github.get_file( repo, 'app.json', commit_sha, HEADERS_GITHUB )
+    return json.loads(app_json) if app_json else {}
+
+def add_pr_comment( repo, pr_id, message):
+    payload = {
+        'body': message
+    }
+    r = client.post(API_URL_GITHUB+'/repos/'+repo+'/issues/'+str(pr_id)+'/comments', headers=HEADERS_GITHUB, data=json.dumps(payload))
+    comment = json.loads(r.text)
+    return comment
+
+def update_boot_timeout(app_name, timeout):
+    data = json.dumps({
+        "value": timeout
+    })
+
+    url = "%s/apps/%s/limits/boot_timeout" % (API_URL_HEROKU, app_name)
+    return client.put(url, headers=HEADERS_HEROKU, data=data)
+
+# Non-API-Related Functions ####################################################
+
+def get_app_name( svc_origin, svc_name, pr_num, prefix ):
+    if svc_origin != svc_name:
+        # if related app, we append the app name
+        name = "%s-%s-pr-%s-%s" % ( prefix, svc_origin, pr_num, svc_name )
+    else:
+        # if this is the originating app, just name it like vanilla review apps
+        name = "%s-%s-pr-%s" % ( prefix, svc_origin, pr_num )
+    # truncate to 30 chars for Heroku
+    return name[:30]
+
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# get the github event json
+GH_EVENT = {}
+if 'GITHUB_EVENT_PATH' in environ:
+    EVENT_FILE = environ['GITHUB_EVENT_PATH']
+    with open(EVENT_FILE, 'r', encoding="utf-8") as eventfile:
+        GH_EVENT = json.load(eventfile)
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'BRANCH',
+    'BUILDPACKS',
+    'HEROKU_TEAM_NAME',
+    'HEROKU_PIPELINE_NAME',
+    'REPO',
+    'REPO_ORIGIN',
+    'APP_REF',
+    'APP_PREFIX',
+    'APP_NAME',
+    'APP_ORIGIN',
+    'GRANT_EXCLUDE',
+    'POOL_SIZE',
+    'PROMOTE_FROM',
+    'REDEPLOY',
+    'WAIT_TIMEOUT',
+    'ENVIRONMENT',
+    'ENVIRONMENT_FILE'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+# overall time we allow each app to spawn and build, in seconds
+wait_timeout = int(args['WAIT_TIMEOUT']) if 'WAIT_TIMEOUT' in args else wait.DEFAULT_DEADLINE
+
+# rebuild existing related apps whose branch head has moved?
+redeploy = args.get('REDEPLOY', 'false').lower() == 'true'
+
+# how many built related apps to keep ready to claim, per related app
+pool_size = int(args.get('POOL_SIZE', '0'))
+REFILLS = concurrent.futures.ThreadPoolExecutor(max_workers=REFILL_WORKERS)
+
+# pipeline stages to look in for a slug to promote onto new related apps
+promote_from = [ x.strip() for x in args.get('PROMOTE_FROM', '').split(',') if x.strip() ]
+
+# ENVIRONMENT / ENVIRONMENT_FILE deploy the whole review environment in one
+# run: a JSON list with one object per app, holding that app's APP_NAME,
+# HEROKU_PIPELINE_NAME and (for related apps) REPO, BRANCH and APP_REF.
+environment = None
+if 'ENVIRONMENT_FILE' in args:
+    with open(args['ENVIRONMENT_FILE'], 'r', encoding="utf-8") as environment_file:
+        environment = json.load(environment_file)
+elif 'ENVIRONMENT' in args:
+    environment = json.loads(args['ENVIRONMENT'])
+
+# determine the app_short_name - short name that references the type of service
+if environment is not None:
+    app_short_name = args['APP_ORIGIN'] if 'APP_ORIGIN' in args else environment[0]['APP_NAME']
+else:
+    app_short_name = args['APP_NAME']
+log.info("Service Name: "+app_short_name)
+
+# if this APP_ORIGIN is not specified, then we are deploying the originating
+# service. Fill in the value of this var just for ease of use.
+app_origin = app_short_name
+if 'APP_ORIGIN' in args:
+    app_origin = args['APP_ORIGIN']
+    # if required transform origin repo name into app name
+    if app_origin == "real-server":
+        app_origin = "web"
+    if app_origin == "inventory-service":
+        app_origin = "inventory"
+log.info("Originating Service: "+app_origin)
+
+# pull branch name from the GITHUB_REF
+try:
+    branch_origin = GH_EVENT['pull_request']['head']['ref'] # this has been more reliable
+except:
+    branch_origin = environ['GITHUB_REF'][11:] # this is sometimes wrong
+origin_commit_sha = environ['GITHUB_SHA']
+
+# set the app name prefix properly
+app_prefix = args['APP_PREFIX']
+
+# we always need to know the originating repo:
+repo_origin = environ['GITHUB_REPOSITORY']
+
+grant_exclude = set( x.strip() for x in args.get('GRANT_EXCLUDE', DEFAULT_GRANT_EXCLUDE).split(',') if x.strip() )
+
+# DETERMINE THE PR #############################################################
+
+trace.set_phase('lookup')
+
+# fetch the PR, its labels and the head of every related app's branch from
+# GitHub in one GraphQL query - the lookups below are then answered from memory
+related_branches = [ (x['REPO'], x['BRANCH']) for x in (environment or [args]) if x.get('APP_NAME', app_origin) != app_origin and 'REPO' in x ]
+if related_branches or 'pull_request' not in GH_EVENT:
+    github.prefetch( repo_origin, branch_origin, related_branches, HEADERS_GITHUB )
+
+try:
+    # we expect that the event payload has a pull_request object at the first level
+    pr = GH_EVENT['pull_request']
+except:
+    try:
+        # look up the PR number for origin repo
+        pr = github.get_pr_by_branch( repo_origin, branch_origin, HEADERS_GITHUB )
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+        sys.exit("Couldn't find a PR for this branch - %s@%s" % (repo_origin, branch_origin))
+    if pr is None:
+        sys.exit("Couldn't find a PR for this branch - %s@%s" % (repo_origin, branch_origin))
+
+pr_num = pr['number']
+pr_labels = [x['name'] for x in pr['labels']]
+pr_status = pr['state']
+log.info("Found Pull Request: \"%s\" id: %s (%s)" % (pr['title'].encode('utf-8'), pr_num, pr_status))
+log.info("Detected Labels: " + ', '.join(pr_labels))
+
+# DEPLOY ONE APP ###############################################################
+
+def get_app_refs( app_ref ):
+    # APP_REF is a list of config vars referencing other apps. The config
+    # vars are delimited by '|' and key=value pairs are separated by '%'.
+    # This code will expand the value provided into:
+    #   {APP_PREFIX}-{MAIN_APP}-{value}-{branch}
+    #
+    # for example:
+    #   APP_REF=MY_API_URL%https://<app_name>/graphql|MY_HOST%https://<app_name>/
+    # this will result in 2 config vars:
+    #   MY_API_URL=https://myteam-someappname.herokuapp.com/graphql
+    #   MY_HOST=https://myteam-someappname.herokuapp.com
+    #
+    # Returns the config vars and the short names of the referenced apps.
+    set_vars = {}
+    referenced = set()
+    if app_ref:
+        for pair in app_ref.split('|'):
+            (app_var, app_url) = pair.split('%')
+            m = re.match(r'^(.*)<(.+)>(.*)$', app_url)
+            name = m.group(2)
+            referenced.add(name)
+            set_vars[app_var] = m.group(1) + get_app_name( app_origin, name, pr_num, app_prefix ) + APP_DOMAIN_SUFFIX + m.group(3)
+    return set_vars, referenced
+
+def deploy_app( spec ):
+    trace.set_phase('lookup')
+    app_short_name = spec['APP_NAME']
+    is_origin = app_short_name == app_origin
+
+    # are we deploying the originating app, or a related app?
+    if is_origin:
+        repo = repo_origin
+        branch = branch_origin
+        commit_sha = origin_commit_sha
+    else:
+        repo = spec['REPO']
+        branch = spec['BRANCH']
+        commit_sha = get_latest_commit_for_branch( repo, branch )
+
+    log.info("[%s] Repo: %s - Branch to deploy: %s" % (app_short_name, repo, branch))
+
+    # determine the app_name
+    app_name = get_app_name( app_origin, app_short_name, pr_num, app_prefix )
+    log.info("App Name: "+app_name)
+
+    # find the pipeline where we want to spawn the app
+    pipeline_name = spec['HEROKU_PIPELINE_NAME']
+    try:
+        pipeline = get_pipeline_by_name( pipeline_name )
+        log.info("Found pipeline: " + pipeline['name'] + ' - id: ' + pipeline['id'])
+    except:
+        sys.exit("Couldn't find the pipeline named " + pipeline_name)
+
+    # if this is not a labelled PR
+    if ( REQUIRE_LABEL and LABEL_NAME not in pr_labels ):
+        if get_app_by_name_or_id( app_name ):
+            # if app is already spun up, shut it down
+            log.info("Spinning down app "+app_name)
+            delete_app_by_name( app_name )
+        elif REQUIRE_LABEL:
+            # If nothing is spun up so far, but labels are required
+            log.info("To spin up a review environment, label your open pr with "+LABEL_NAME)
+        elif pr_status == 'closed':
+            log.info("This PR is currently closed.")
+        else:
+            log.info("Quitting. Either label missing or PR is closed.")
+        return None
+
+    # START CREATING/DEPLOYING #################################################
+
+    # see if there's a review app for this branch already
+    reviewapp = get_app_by_name_or_id( app_name )
+
+    # if it wasn't found, try to use an existing review app if it already exists
+    if reviewapp is None and is_origin:
+        log.info("Looking up the app by branch instead")
+        reviewapp = get_review_app_by_branch( pipeline['id'], branch)
+
+    if reviewapp is not None:
+        log.info("Found reviewapp id: " + reviewapp['id'] )
+        log.debug("%s", log.lazy_json(reviewapp))
+
+        # Originating App - doesn't need to be deployed because Review Apps Beta
+        #   automatically deploys on push to the PR.
+        # Related App - we do not deploy here b/c we don't want to disrupt the state
+        #   of the related app as that may affect testing - unless REDEPLOY asks
+        #   us to follow its branch, and then only if the branch head moved.
+        if is_origin or not redeploy:
+            log.info("Already exists - no action necessary.")
+        elif commit_sha is None:
+            log.warning("Couldn't find the head of %s@%s - leaving the app as it is." % (repo, branch))
+        else:
+            trace.set_phase('redeploy')
+            reconcile_app( reviewapp['id'], repo, commit_sha, wait_timeout )
+        return app_name
+
+    log.info("Found no existing app.")
+    trace.set_phase('create')
+
+    # a related app can be taken ready-made from its warm pool, which is then
+    # topped up again in the background
+    claimed = None
+    if not is_origin and pool_size and commit_sha is not None:
+        claimed = claim_pool_app( app_short_name, app_name, commit_sha )
+        if claimed is not None:
+            log.info("Claimed pool app %s." % claimed['name'])
+        REFILLS.submit( trace.propagate( refill_pool ), app_short_name, repo, commit_sha, pipeline )
+
+    # a related app can be released from the slug another app of its pipeline
+    # already built from the same commit, instead of being built again
+    slug = None
+    if not is_origin and promote_from and commit_sha is not None and claimed is None:
+        slug, slug_app_id = find_promotable_slug( pipeline['id'], commit_sha, promote_from )
+        if slug is None:
+            log.info("No %s app of %s runs %s - building it." % ('/'.join(promote_from), pipeline['name'], commit_sha[:7]))
+        else:
+            app_json = get_app_json( repo, commit_sha )
+            if (app_json.get('scripts') or {}).get('postdeploy'):
+                # only an app-setup runs the postdeploy script
+                log.info("app.json has a postdeploy script - building it.")
+                slug = None
+            else:
+                log.info("Promoting slug %s of app %s." % (slug['id'], slug_app_id))
+
+    if slug is None and claimed is None:
+        # Heroku wants us to pull the 302 location for the actual code download by
+        # using this URL - the token gets modified, we don't know how, so we gotta pull
+        # it before submitting to Heroku.
+        source_code_tgz = get_download_url( repo, branch, GHA_USER_TOKEN )
+        if source_code_tgz is None:
+            sys.exit("Couldn't get the redirect location for source code download.")
+
+    # CHECK AND SET CONFIG VARIABLES FOR APP REFERENCES ########################
+
+    set_vars, referenced = get_app_refs( spec.get('APP_REF') )
+    for k, v in set_vars.items():
+        log.info("Referencing app: " + k + '=' + v)
+    set_vars['HEROKU_APP_NAME'] = app_name
+
+    wait_until = time.monotonic() + wait_timeout
+    def remaining_wait():
+        return max( 0, wait_until - time.monotonic() )
+
+    if claimed is not None:
+        # the pool app is built, has the pipeline's config vars and is attached
+        # to the pipeline - it only needs its references
+        if set_config_vars_for_app( claimed['id'], set_vars ) is None:
+            sys.exit("Couldn't set the config vars of app "+app_name)
+
+    elif is_origin:
+        # This is the originating app - deploy it like a reviewapp.
+        log.info("Creating reviewapp...")
+        payload = {
+            'branch': branch,
+            'pipeline': pipeline['id'],
+            'source_blob': {
+                'url': source_code_tgz,
+                'version': commit_sha,
+            },
+            'environment': set_vars,
+            'skip_rollback': True
+        }
+        log.debug("%s", log.lazy_json(payload))
+        try:
+            r = client.post(API_URL_HEROKU+'/review-apps', headers=HEADERS_HEROKU, data=json.dumps(payload))
+            response = json.loads(r.text)
+            log.info("Created ReviewApp: %s", log.lazy_summary(response))
+            log.debug("%s", log.lazy_json(response))
+            reviewapp_id = response['id']
+            log.info("Status is currently " + response['status'])
+        except Exception as ex:
+            log.warning(ex)
+            traceback.print_exc()
+            sys.exit("Couldn't create ReviewApp.")
+
+        # wait for the review app to finish spawning
+        reviewapp_poll_state = {}
+        try:
+            reviewapp = wait.wait_for(
+                lambda: get_review_app_by_id( reviewapp_id, reviewapp_poll_state ),
+                lambda x: x is not None and x['status'] in REVIEW_APP_TERMINAL_STATES,
+                "review app %s" % reviewapp_id,
+                deadline=remaining_wait() )
+        except wait.WaitTimeout as ex:
+            sys.exit(str(ex))
+        log.info("Result: %s", log.lazy_summary(reviewapp))
+        log.debug("%s", log.lazy_json(reviewapp))
+        if reviewapp['status'] != 'created' or not reviewapp.get('app'):
+            sys.exit("Review app %s is %s: %s" % (reviewapp_id, reviewapp['status'], reviewapp.get('message') or reviewapp.get('error_status')))
+        app_id = reviewapp['app']['id']
+
+        # rename the reviewapp (which should just be an app now)
+        if rename_app( app_id, app_name ):
+            log.info("Renamed the app to "+app_name)
+        else:
+            sys.exit("Failed to rename the app!")
+
+        # the app is only usable once its build has gone through
+        wait_for_build( app_id, remaining_wait() )
+
+    else:
+        # this is a related app, deploy it as a into the development pipeline phase
+        log.info("Creating development phase app...")
+
+        # get the config vars from review apps beta config vars in the pipeline
+        # we have a feature request in to Heroku for a list of default config
+        # vars for development phase apps
+        log.info("Pulling Config Vars from pipeline "+pipeline['name'])
+        config_vars = get_review_app_config_vars_for_pipeline( pipeline['id'], 'review' )
+        if not config_vars:
+            sys.exit("Pulled no config vars from pipeline: "+pipeline['name'])
+        else:
+            log.info("Found %s Config Vars to set." % len(config_vars.keys()))
+        for k,v in set_vars.items():
+            config_vars[k] = v
+
+        if slug is not None:
+            app = create_app_from_slug( app_name, args['HEROKU_TEAM_NAME'], slug, slug_app_id, app_json, config_vars, remaining_wait() )
+        else:
+            # an app-setup is just like a reviewapp like above. It is almost like
+            # and environment setup in that it creates the app, reads app.json and
+            # performs the necessary spin-ups and attachments.
+            app_setup = create_app_setup( app_name, args['HEROKU_TEAM_NAME'], source_code_tgz, commit_sha, config_vars )
+            if app_setup is None:
+                sys.exit("Couldn't create app setup for "+app_name)
+
+            # wait for the app-setup (app, addons and build) to finish
+            app_setup_id = app_setup['id']
+            try:
+                app_setup = wait.wait_for(
+                    lambda: get_app_setup_by_id( app_setup_id ),
+                    lambda x: x.get('status') in APP_SETUP_TERMINAL_STATES,
+                    "app setup %s" % app_setup_id,
+                    deadline=remaining_wait() )
+            except wait.WaitTimeout as ex:
+                sys.exit(str(ex))
+            log.info("Result: %s", log.lazy_summary(app_setup))
+            log.debug("%s", log.lazy_json(app_setup))
+            if app_setup['status'] != 'succeeded':
+                sys.exit("App setup %s failed: %s" % (app_setup_id, app_setup.get('failure_message')))
+            app = app_setup['app']
+
+        # attach to pipeline as development app
+        log.info("Attaching to pipeline...")
+        if not add_to_pipeline( pipeline['id'], app['id'], 'development' ):
+            sys.exit("Couldn't attach app %s to pipeline %s" % (app['id'],pipeline['id']))
+
+    # # Update boot timeout
+    trace.set_phase('configure')
+    log.info("Updating boot timeout...")
+    res = update_boot_timeout(app_name, 180)
+    if res.ok:
+        log.info(res.json())
+    else:
+        log.warning("Error updating boot timeout!")
+        log.warning(res.text)
+
+    # grant access to all users
+    trace.set_phase('grants')
+    grant_review_app_access_to_team( app_name, args['HEROKU_TEAM_NAME'], grant_exclude )
+
+    message = 'Deployed app <a href="https://%s.herokuapp.com">%s</a> - [ <a href="https://dashboard.heroku.com/apps/%s">app: %s</a> | <a href="https://dashboard.heroku.com/apps/%s/logs">logs</a> ]<br>' % (app_name, app_short_name, app_name, app_name, app_name)
+    log.info(message)
+    return app_name
+
+# DEPLOY THE WHOLE ENVIRONMENT #################################################
+
+def get_environment_order( specs ):
+    # Apps that are referenced by others in their APP_REF go first, so with
+    # more apps than workers the apps talked to tend to come up earlier. This
+    # is only a hint: the referenced names come from get_app_name(), so no app
+    # has to exist before another can be created, and apps referring to each
+    # other are fine.
+    names = set( x['APP_NAME'] for x in specs )
+    referenced = set()
+    for spec in specs:
+        set_vars, refs = get_app_refs( spec.get('APP_REF') )
+        referenced |= ( refs & names ) - { spec['APP_NAME'] }
+    return sorted( specs, key=lambda x: x['APP_NAME'] not in referenced )
+
+def deploy_environment( specs ):
+    # Deploys every app of the environment in parallel. Returns the short names
+    # of the apps that failed.
+    failed = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ENVIRONMENT_WORKERS) as pool:
+        running = {}
+        for spec in get_environment_order( specs ):
+            log.info("Scheduling %s..." % spec['APP_NAME'])
+            running[pool.submit( deploy_app, spec )] = spec['APP_NAME']
+        for future in concurrent.futures.as_completed(running):
+            name = running[future]
+            try:
+                future.result()
+            except BaseException as ex:
+                log.warning("Deploying %s failed: %s" % (name, ex))
+                failed.add(name)
+    return failed
+
+try:
+    if environment is not None:
+        log.info("Deploying %d apps: %s" % (len(environment), ', '.join(x['APP_NAME'] for x in environment)))
+        # warm the lookups that every app shares before fanning out
+        get_pipelines()
+        get_team_members( args['HEROKU_TEAM_NAME'] )
+        failed = deploy_environment( environment )
+        if failed:
+            sys.exit("Failed to deploy: " + ', '.join(sorted(failed)))
+    else:
+        deploy_app( args )
+finally:
+    # let the pool refills finish, and don't leave the workers behind when
+    # review-envs serve runs us again
+    REFILLS.shutdown(wait=True)
+
+log.info("Done.")
@@ -0,0 +1,177 @@
+# review-envs destroy: deletes a review environment app, or the whole environment.
+# Run by the heroku-app-destroy action.
+
+import json
+import sys
+
+from review_envs import cli
+from review_envs import client
+from review_envs import heroku
+from review_envs import log
+from review_envs import okta
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# constants
+NEUTRAL_EXIT_CODE = 78
+PAGE_SIZE = 1000
+
+# get the event payload
+GITHUB_EVENT_PATH = environ['GITHUB_EVENT_PATH']
+
+# tokens
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+HEADERS_HEROKU_LIST = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=PAGE_SIZE )
+API_URL_HEROKU = client.API_URL_HEROKU
+
+# Heroku Related Functions #####################################################
+
+def delete_app_by_name( app_name ):
+    if '-pr-' not in app_name:
+        sys.exit("Tried to delete app "+app_name+" - refusing for safety's sake.")
+    r = client.delete(API_URL_HEROKU+'/apps/'+app_name, headers=HEADERS_HEROKU)
+    response = json.loads(r.text)
+    return response
+
+def get_environment_app_names( team_name, base_name ):
+    # One listing of the team's apps finds the whole environment: the
+    # originating app is named base_name and its related apps base_name-<app>.
+    # Names are cut to 30 characters, so compare against the cut prefix. A
+    # base_name of 30 or more has no room left for the '-' that ends the PR
+    # number (pr-1 would match pr-12), so only the exact name is safe then.
+    apps = heroku.list_team_apps( team_name, HEADERS_HEROKU_LIST )
+    if len(base_name) >= 30:
+        log.warning("%s leaves no room for related app names - only deleting the app named %s." % (base_name, base_name[:30]))
+        return [ x['name'] for x in apps if x['name'] == base_name[:30] ]
+    prefix = base_name + '-'
+    return [ x['name'] for x in apps if x['name'] == base_name or x['name'].startswith(prefix) ]
+
+# Non-API-Related Functions ####################################################
+
+def get_app_name( svc_origin, svc_name, pr_num, prefix ):
+    if svc_origin != svc_name:
+        # if related app, we append the app name
+        name = "%s-%s-pr-%s-%s" % ( prefix, svc_origin, pr_num, svc_name )
+    else:
+        # if this is the originating app, just name it like vanilla review apps
+        name = "%s-%s-pr-%s" % ( prefix, svc_origin, pr_num )
+    # truncate to 30 chars for Heroku
+    return name[:30]
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'APP_PREFIX',
+    'APP_NAME',
+    'APP_ORIGIN',
+    'TEARDOWN',
+    'URL_TARGET',
+    'OKTA_API_URL'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+# TEARDOWN=true destroys every app of the PR's environment instead of one
+teardown = args.get('TEARDOWN', 'false').lower() == 'true'
+
+# determine the app_short_name - short name that references the type of service
+app_short_name = args['APP_NAME'] if 'APP_NAME' in args or not teardown else args['APP_ORIGIN']
+log.info("Service Name: "+app_short_name)
+
+# if this APP_ORIGIN is not specified, then we are deploying the originating
+# service. Fill in the value of this var just for ease of use.
+app_origin = app_short_name
+if 'APP_ORIGIN' in args:
+    app_origin = args['APP_ORIGIN']
+    # if required transform origin repo name into app name
+    if app_origin == "real-server":
+        app_origin = "web"
+    if app_origin == "inventory-service":
+        app_origin = "inventory"
+log.info("Originating Service: "+app_origin)
+
+# set the app name prefix properly
+app_prefix = args['APP_PREFIX']
+
+# the Okta cleanup runs after the deletions, so check its inputs first
+if 'OKTA_API_URL' in args:
+    if not args.get('URL_TARGET'):
+        sys.exit("OKTA_API_URL is set, so URL_TARGET is required.")
+    if 'OKTA_API_TOKEN' not in environ:
+        sys.exit("OKTA_API_URL is set, so OKTA_API_TOKEN is required.")
+
+# DETERMINE THE APP NAME #######################################################
+
+# look up the PR number for origin repo
+payload = None
+with open( GITHUB_EVENT_PATH, 'r', encoding="utf-8" ) as payload_file:
+    payload_data = payload_file.read()
+    payload = json.loads(payload_data)
+    log.debug("GitHub Event Payload: %s", log.lazy_json(payload))
+if payload is None:
+    log.warning( "Could not get GitHub Event Payload" )
+    # don't fail the action, as it'll cause the rest of the pipeline to be cancelled
+    sys.exit( NEUTRAL_EXIT_CODE )
+pr_num = payload['number']
+
+if teardown:
+    # find every app of this environment and delete them all at once
+    base_name = get_app_name( app_origin, app_origin, pr_num, app_prefix )
+    log.info("Environment: "+base_name)
+    app_names = get_environment_app_names( args['HEROKU_TEAM_NAME'], base_name )
+    log.info("Found %d apps: %s" % (len(app_names), ', '.join(app_names)))
+    try:
+        failed = heroku.delete_apps( app_names, HEADERS_HEROKU )
+    except ValueError as ex:
+        sys.exit(str(ex))
+    deleted = [ x for x in app_names if x not in failed ]
+else:
+    # determine the app_name
+    app_name = get_app_name( app_origin, app_short_name, pr_num, app_prefix )
+
+    log.info("App Name: "+app_name)
+
+    result = delete_app_by_name( app_name )
+
+    log.info("Result of Deletion: %s", log.lazy_summary(result))
+    log.debug("%s", log.lazy_json(result))
+    failed = []
+    deleted = [ app_name ]
+
+# remove the deleted apps from the Okta whitelist in the same run
+if 'OKTA_API_URL' in args and deleted:
+    url_targets = [ x for x in args['URL_TARGET'].split('|') if x ]
+    uris = [ url % name for name in deleted for url in url_targets ]
+    headers_okta = client.okta_headers( environ['OKTA_API_TOKEN'] )
+    if not okta.update_redirect_uris( args['OKTA_API_URL'], headers_okta, remove=uris ):
+        log.warning("There was a problem removing %s from the Okta whitelist. Please investigate." % ', '.join(uris))
+
+if failed:
+    sys.exit("Couldn't delete apps: %s" % ', '.join(failed))
+
+log.info("Done.")
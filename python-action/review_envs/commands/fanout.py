@@ -0,0 +1,230 @@
+# review-envs fanout: builds a related app's branch once and releases the slug
+# to that app's copy in every open review environment.
+# Run by the heroku-app-fanout action.
+
+import concurrent.futures
+import json
+import re
+import sys
+
+from review_envs import cli
+from review_envs import client
+from review_envs import github
+from review_envs import heroku
+from review_envs import log
+from review_envs import trace
+from review_envs import wait
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# constants
+PAGE_SIZE = 1000
+FANOUT_WORKERS = 8
+BUILD_TERMINAL_STATES = ['succeeded', 'failed']
+
+# tokens
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+GITHUB_TOKEN = environ['GITHUB_TOKEN']
+# the tarball of a related repo may need more access than the workflow's token
+GHA_USER_TOKEN = environ.get('GHA_USER_TOKEN', GITHUB_TOKEN)
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+HEADERS_HEROKU_LIST = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=PAGE_SIZE )
+
+API_URL_HEROKU = client.API_URL_HEROKU
+
+# basic headers for communicating with the GitHub API
+HEADERS_GITHUB = client.github_headers( GHA_USER_TOKEN )
+
+# Heroku Related Functions #####################################################
+
+def get_build( app_id, build_id ):
+    r = client.get(API_URL_HEROKU+'/apps/'+app_id+'/builds/'+build_id, headers=HEADERS_HEROKU)
+    return json.loads(r.text)
+
+def get_current_slugs( apps ):
+    # {app name: current slug or None}, read in parallel
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FANOUT_WORKERS) as pool:
+        get_slug = trace.propagate( heroku.get_current_slug )
+        slugs = pool.map( lambda x: get_slug( x['id'], HEADERS_HEROKU ), apps )
+        return dict(zip( [ x['name'] for x in apps ], slugs ))
+
+def get_branch_copies( copies, slugs, head ):
+    # Keeps the copies whose deployed commit is in the branch's history, so
+    # head can replace it. A copy deployed from any other branch - its own PR,
+    # say - is left alone, and so is one whose commit is unknown. Copies with
+    # nothing deployed yet are kept.
+    commits = set( slugs[x['name']].get('commit') for x in copies if slugs[x['name']] and slugs[x['name']].get('commit') )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FANOUT_WORKERS) as pool:
+        compare = trace.propagate( github.compare_commits )
+        statuses = dict(zip( commits, pool.map( lambda x: compare( repo, x, head, HEADERS_GITHUB ), commits ) ))
+    kept = []
+    for app in copies:
+        slug = slugs[app['name']]
+        if not slug:
+            kept.append(app)
+        elif statuses.get(slug.get('commit')) == 'ahead':
+            kept.append(app)
+        else:
+            log.info("Skipping %s: it runs %s, which isn't from %s." % (app['name'], (slug.get('commit') or '?')[:7], branch))
+    return kept
+
+def release_to_apps( slug, apps ):
+    # Releases the slug to every app in parallel. Returns the names that failed.
+    description = "Fan out %s" % (slug.get('commit') or slug['id'])[:7]
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FANOUT_WORKERS) as pool:
+        release = trace.propagate( heroku.release_slug )
+        futures = { pool.submit( release, x['id'], slug['id'], HEADERS_HEROKU, description ): x['name'] for x in apps }
+        for future in concurrent.futures.as_completed(futures):
+            app_name = futures[future]
+            try:
+                released = future.result()
+            except Exception as ex:
+                log.warning(ex)
+                released = None
+            if released:
+                log.info("Released %s to %s (v%s)." % (slug['id'], app_name, released.get('version')))
+            else:
+                log.warning("Couldn't release %s to %s." % (slug['id'], app_name))
+                failed.append(app_name)
+    return failed
+
+# Non-API-Related Functions ####################################################
+
+def get_app_name( svc_origin, svc_name, pr_num, prefix ):
+    # the related app's name in an environment, truncated to 30 chars for Heroku
+    return ( "%s-%s-pr-%s-%s" % ( prefix, svc_origin, pr_num, svc_name ) )[:30]
+
+def get_environment_copies( apps, prefix, origins, app_short_name ):
+    # The apps that are app_short_name's copy in a review environment. The
+    # name is checked in full, truncation included, so another related app of
+    # the same environment never matches.
+    pattern = re.compile( r'^%s-(%s)-pr-(\d+)-' % ( re.escape(prefix), '|'.join( re.escape(x) for x in origins ) ) )
+    copies = []
+    for app in apps:
+        m = pattern.match(app['name'])
+        if m and app['name'] == get_app_name( m.group(1), app_short_name, m.group(2), prefix ):
+            copies.append(app)
+    return copies
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'APP_PREFIX',
+    'APP_NAME',
+    'REPO',
+    'BRANCH',
+    'REPOS',
+    'DRY_RUN',
+    'WAIT_TIMEOUT'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+team_name = args['HEROKU_TEAM_NAME']
+app_prefix = args['APP_PREFIX']
+app_short_name = args['APP_NAME']
+repo = args.get('REPO', environ.get('GITHUB_REPOSITORY'))
+branch = args.get('BRANCH', 'master')
+dry_run = args.get('DRY_RUN', 'false').lower() == 'true'
+wait_timeout = int(args['WAIT_TIMEOUT']) if 'WAIT_TIMEOUT' in args else wait.DEFAULT_DEADLINE
+
+# REPOS lists the originating repos whose environments hold a copy of the
+# app, separated by |, each optionally followed by %origin when the apps
+# aren't named after the repo: "myorg/real-server%web|myorg/other".
+origins = [ x.split('%')[1] if '%' in x else heroku.get_origin_name( x ) for x in args.get('REPOS', '').split('|') if x ]
+if not origins:
+    sys.exit("No originating repos - set REPOS.")
+
+# FIND THE STALE COPIES ########################################################
+
+commit_sha = github.get_branch_head( repo, branch, HEADERS_GITHUB )
+if commit_sha is None:
+    sys.exit("Couldn't find the head of %s@%s." % (repo, branch))
+log.info("%s@%s is at %s." % (repo, branch, commit_sha[:7]))
+
+# one paginated sweep over the team's apps
+apps = list(heroku.list_team_apps( team_name, HEADERS_HEROKU_LIST ))
+copies = get_environment_copies( apps, app_prefix, origins, app_short_name )
+log.info("Found %d copies of %s in %d apps of team %s." % (len(copies), app_short_name, len(apps), team_name))
+
+slugs = get_current_slugs( copies )
+current = [ x for x in copies if slugs[x['name']] and slugs[x['name']].get('commit') == commit_sha ]
+stale = [ x for x in copies if x not in current ]
+for app in copies:
+    slug = slugs[app['name']]
+    log.info("%-30s %s" % ( app['name'], (slug.get('commit') or '?')[:7] if slug else 'not deployed' ))
+stale = get_branch_copies( stale, slugs, commit_sha )
+log.info("%d of %d copies are behind %s." % (len(stale), len(copies), branch))
+
+if not stale:
+    log.info("Done.")
+    sys.exit(0)
+
+if dry_run:
+    if current:
+        log.info("Would release the slug of %s to: %s" % (current[0]['name'], ', '.join( x['name'] for x in stale )))
+    else:
+        log.info("Would build %s on %s and release it to: %s" % (commit_sha[:7], stale[0]['name'], ', '.join( x['name'] for x in stale[1:] )))
+    log.info("Dry run - nothing deployed.")
+    sys.exit(0)
+
+# BUILD ONCE ###################################################################
+
+if current:
+    # a copy already runs the commit - its slug is all we need
+    slug = slugs[current[0]['name']]
+    log.info("Reusing slug %s of %s." % (slug['id'], current[0]['name']))
+else:
+    # build on one of the stale copies; its release is part of the fan-out
+    builder = stale.pop(0)
+    log.info("Building %s on %s..." % (commit_sha[:7], builder['name']))
+    source_code_tgz = github.get_download_url( repo, commit_sha, GHA_USER_TOKEN )
+    if source_code_tgz is None:
+        sys.exit("Couldn't get the redirect location for source code download.")
+    build = heroku.deploy_to_app( builder['id'], source_code_tgz, commit_sha, HEADERS_HEROKU )
+    if build is None:
+        sys.exit("Couldn't start a build on %s." % builder['name'])
+    try:
+        build = wait.wait_for(
+            lambda: get_build( builder['id'], build['id'] ),
+            lambda x: x.get('status') in BUILD_TERMINAL_STATES,
+            "build %s of %s" % (build['id'], builder['name']),
+            deadline=wait_timeout )
+    except wait.WaitTimeout as ex:
+        sys.exit(str(ex))
+    if build['status'] != 'succeeded':
+        sys.exit("Build %s of %s %s." % (build['id'], builder['name'], build['status']))
+    slug = { 'id': build['slug']['id'], 'commit': commit_sha }
+
+# FAN OUT ######################################################################
+
+failed = release_to_apps( slug, stale )
+if failed:
+    sys.exit("Couldn't release to: %s" % ', '.join(sorted(failed)))
+
+log.info("Done.")
@@ -1,29 +1,28 @@
-#!/usr/bin/env python3
+# review-envs okta-add: adds review environment URIs to the Okta whitelist.
+# Run by the okta-whitelist-url-create action.
 
 import json
-import os
-import requests
 import sys
 
+from review_envs import cli
+from review_envs import client
+from review_envs import log
+from review_envs import okta
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
 # tokens
-OKTA_API_TOKEN = os.environ['OKTA_API_TOKEN']
-GHA_USER_TOKEN = os.environ['GHA_USER_TOKEN']
+OKTA_API_TOKEN = environ['OKTA_API_TOKEN']
+GHA_USER_TOKEN = environ['GHA_USER_TOKEN']
 
 # basic headers for communicating with the Okta API
-HEADERS_OKTA = {
-    'Accept': 'application/json',
-    'Authorization': 'SSWS %s' % OKTA_API_TOKEN,
-    'Content-Type': 'application/json'
-    }
+HEADERS_OKTA = client.okta_headers( OKTA_API_TOKEN )
 
 # basic headers for communicating with the GitHub API
-HEADERS_GITHUB = {
-    'Accept': 'application/vnd.github.v3+json',
-    'Authorization': 'token %s' % GHA_USER_TOKEN,
-    'User-Agent': 'Heroku GitHub Actions Provider by TheRealReal',
-    'Content-Type': 'application/json'
-    }
-API_URL_GITHUB = 'https://api.github.com'
+HEADERS_GITHUB = client.github_headers( GHA_USER_TOKEN )
+API_URL_GITHUB = client.API_URL_GITHUB
 
 # Non-API-Related Functions ####################################################
 
@@ -37,24 +36,19 @@ def get_app_name( svc_origin, svc_target, pr_num, prefix ):
 
 # PROCESS ENV and ARGS #########################################################
 
-print ("Start "+sys.argv[0])
-def mask( k, v ):
-    if 'TOKEN' in k or 'SECRET' in k:
-        return '***'
-    else:
-        return v
-print ("Environment: " + str({k: mask(k,v) for k, v in os.environ.items()}))
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
 
 # get the github event json
-if 'GITHUB_EVENT_PATH' in os.environ:
-    EVENT_FILE = os.environ['GITHUB_EVENT_PATH']
+if 'GITHUB_EVENT_PATH' in environ:
+    EVENT_FILE = environ['GITHUB_EVENT_PATH']
     with open(EVENT_FILE, 'r', encoding="utf-8") as eventfile:
         GH_EVENT = json.load(eventfile)
 
 # support arguments passed in via the github actions workflow via the syntax
 # args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
 args = {}
-for arg in sys.argv:
+for arg in argv:
     pair = arg.split('=')
     if len(pair) > 1:
         args[pair[0]] = '='.join(pair[1:])
@@ -70,10 +64,10 @@ args_or_envs = [
     'OKTA_API_URL'
 ]
 for i in args_or_envs:
-    if i not in args and i in os.environ:
-        args[i] = os.environ[i]
+    if i not in args and i in environ:
+        args[i] = environ[i]
 
-print ("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
 
 # GET THE INPUTS SET UP RIGHT ##################################################
 
@@ -84,22 +78,23 @@ if app_origin == "real-server":
 if app_origin == "inventory-service":
     app_origin = "inventory"
 
-print("Originating Service: "+app_origin)
+log.info("Originating Service: "+app_origin)
 
-app_target = args['APP_TARGET']
-print("Target Service: "+app_target)
+# APP_TARGET may list several apps of the environment, e.g. "myapp,admin"
+app_targets = [ x.strip() for x in args['APP_TARGET'].split(',') if x.strip() ]
+log.info("Target Services: "+', '.join(app_targets))
 
 # pull branch name from the GITHUB_REF
 try:
     branch_origin = GH_EVENT['pull_request']['head']['ref'] # this has been more reliable
 except:
-    branch_origin = os.environ['GITHUB_REF'][11:] # this is sometimes wrong
+    branch_origin = environ['GITHUB_REF'][11:] # this is sometimes wrong
 
 # set the app name prefix properly
 app_prefix = args['APP_PREFIX']
 
 # we always need to know the originating repo:
-repo_origin = os.environ['GITHUB_REPOSITORY']
+repo_origin = environ['GITHUB_REPOSITORY']
 
 # set the Okta API URL
 api_url_okta = args['OKTA_API_URL']
@@ -110,41 +105,29 @@ try:
     # we expect that the event payload has a pull_request object at the first level
     pr = GH_EVENT['pull_request']
 except Exception as ex:
-    print(ex)
+    log.warning(ex)
     sys.exit("Couldn't find a PR for this branch - " + repo_origin + '@' + branch_origin)
 
 pr_num = pr['number']
 pr_labels = [x['name'] for x in pr['labels']]
 pr_status = pr['state']
-print ("Found Pull Request: \"" + pr['title'] + "\" id: " + str(pr_num))
+log.info("Found Pull Request: \"" + pr['title'] + "\" id: " + str(pr_num))
 
-# determine the app_name
-app_name = get_app_name( app_origin, app_target, pr_num, app_prefix )
+# determine the app names
+app_names = [ get_app_name( app_origin, x, pr_num, app_prefix ) for x in app_targets ]
 
-print ("App Name: " + app_name)
+log.info("App Names: " + ', '.join(app_names))
 
 # START UPDATING WHITELIST #####################################################
 
-print ("Staring Okta Whitelist URL Create")
-
-uri_to_add = args['URL_TARGET'] % app_name
-
-r = requests.get(api_url_okta, headers=HEADERS_OKTA)
-client = json.loads(r.text)
-
-redirect_uris = client['redirect_uris']
-
-if not any(uri_to_add in s for s in redirect_uris):
-  print ('The URI %s is NOT whitelisted. Adding it to the whitelist now!' % uri_to_add)
-  redirect_uris.append(uri_to_add)
-  del client['client_secret_expires_at']
-  del client['client_id_issued_at']
+log.info("Starting Okta Whitelist URL Create")
 
-  r2 = requests.put(api_url_okta, headers=HEADERS_OKTA, data=json.dumps(client))
+# URL_TARGET may hold several templates separated by |, each is applied to
+# every target app and all of the URIs go to Okta in a single update
+url_targets = [ x for x in args['URL_TARGET'].split('|') if x ]
+uris = [ url % name for name in app_names for url in url_targets ]
 
-  if r2.status_code == 200:
-    print ('The URI %s has been added to the whitelist!' % uri_to_add)
-  else:
-    print ('There was a problem adding the URI %s to the whitelist. Please investigate.')
+if okta.update_redirect_uris( api_url_okta, HEADERS_OKTA, add=uris ):
+    log.info('The URIs %s are whitelisted.' % ', '.join(uris))
 else:
-  print ('The URI %s is already whitelisted' % uri_to_add)
+    sys.exit('There was a problem updating the Okta whitelist for %s. Please investigate.' % ', '.join(uris))
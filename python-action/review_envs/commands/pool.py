@@ -0,0 +1,169 @@
+# review-envs pool: keeps each related app's warm pool filled and fresh.
+# Run by the heroku-app-pool action.
+
+import json
+import sys
+
+from review_envs import cli
+from review_envs import client
+from review_envs import github
+from review_envs import heroku
+from review_envs import log
+from review_envs import wait
+from review_envs import warmpool
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# constants
+PAGE_SIZE = 1000
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_IDLE = 3 * 24 * 60 * 60
+
+# tokens
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+GITHUB_TOKEN = environ['GITHUB_TOKEN']
+# the tarball of a related repo may need more access than the workflow's token
+GHA_USER_TOKEN = environ.get('GHA_USER_TOKEN', GITHUB_TOKEN)
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+HEADERS_HEROKU_LIST = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=PAGE_SIZE )
+HEADERS_HEROKU_REVIEW_PIPELINES = client.heroku_headers( HEROKU_TOKEN, 'pipelines' )
+
+# basic headers for communicating with the GitHub API
+HEADERS_GITHUB = client.github_headers( GHA_USER_TOKEN )
+
+# Non-API-Related Functions ####################################################
+
+def get_evictions( pool_apps, slugs, commit_sha ):
+    # {app name: reason} for the pool apps that should go
+    evict = {}
+    for app in pool_apps:
+        slug = slugs[app['name']]
+        age = warmpool.get_age( app )
+        if slug is None:
+            if age > wait_timeout:
+                evict[app['name']] = 'never finished building'
+        elif slug.get('commit') != commit_sha:
+            evict[app['name']] = 'runs %s' % (slug.get('commit') or '?')[:7]
+        elif age > max_idle:
+            evict[app['name']] = 'idle for %dh' % (age / 3600)
+    # beyond the pool size, the oldest go first
+    keep = sorted(( x for x in pool_apps if x['name'] not in evict ), key=lambda x: x['created_at'], reverse=True)
+    for app in keep[pool_size:]:
+        evict[app['name']] = 'pool is over size'
+    return evict
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'HEROKU_PIPELINE_NAME',
+    'APP_PREFIX',
+    'APP_NAME',
+    'REPO',
+    'BRANCH',
+    'ENVIRONMENT',
+    'ENVIRONMENT_FILE',
+    'POOL_SIZE',
+    'POOL_MAX_IDLE',
+    'WAIT_TIMEOUT',
+    'DRY_RUN'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+team_name = args['HEROKU_TEAM_NAME']
+app_prefix = args['APP_PREFIX']
+pool_size = int(args.get('POOL_SIZE', DEFAULT_POOL_SIZE))
+max_idle = int(args.get('POOL_MAX_IDLE', DEFAULT_MAX_IDLE))
+wait_timeout = int(args['WAIT_TIMEOUT']) if 'WAIT_TIMEOUT' in args else wait.DEFAULT_DEADLINE
+dry_run = args.get('DRY_RUN', 'false').lower() == 'true'
+
+# the related apps to keep pools for: those of an ENVIRONMENT / ENVIRONMENT_FILE
+# as given to create, or the one app described by the arguments
+if 'ENVIRONMENT_FILE' in args:
+    with open(args['ENVIRONMENT_FILE'], 'r', encoding="utf-8") as environment_file:
+        specs = json.load(environment_file)
+elif 'ENVIRONMENT' in args:
+    specs = json.loads(args['ENVIRONMENT'])
+else:
+    specs = [ args ]
+specs = [ x for x in specs if 'REPO' in x ]
+if not specs:
+    sys.exit("No related apps to keep pools for - they need a REPO.")
+
+# KEEP THE POOLS ###############################################################
+
+# one paginated sweep over the team's apps
+apps = list(heroku.list_team_apps( team_name, HEADERS_HEROKU_LIST ))
+
+failed = []
+for spec in specs:
+    app_short_name = spec['APP_NAME']
+    repo = spec['REPO']
+    branch = spec.get('BRANCH', 'master')
+    pipeline = heroku.get_pipeline_by_name( spec['HEROKU_PIPELINE_NAME'], HEADERS_HEROKU )
+    if pipeline is None:
+        sys.exit("Couldn't find the pipeline named " + spec['HEROKU_PIPELINE_NAME'])
+    commit_sha = github.get_branch_head( repo, branch, HEADERS_GITHUB )
+    if commit_sha is None:
+        sys.exit("Couldn't find the head of %s@%s." % (repo, branch))
+
+    pool_apps = warmpool.get_pool_apps( apps, app_prefix, app_short_name )
+    slugs = warmpool.get_pool_slugs( pool_apps, HEADERS_HEROKU )
+    evict = get_evictions( pool_apps, slugs, commit_sha )
+
+    log.info("Pool of %s (%s@%s, %s): %d of %d apps." % (app_short_name, repo, branch, commit_sha[:7], len(pool_apps), pool_size))
+    for app in pool_apps:
+        slug = slugs[app['name']]
+        state = evict.get(app['name']) or ('ready' if slug else 'building')
+        log.info("  %-30s %s" % (app['name'], state))
+
+    missing = pool_size - (len(pool_apps) - len(evict))
+    if dry_run:
+        log.info("Would delete %d and start %d apps." % (len(evict), max(0, missing)))
+        continue
+
+    try:
+        failed += heroku.delete_apps( list(evict), HEADERS_HEROKU )
+    except ValueError as ex:
+        sys.exit(str(ex))
+
+    if missing > 0:
+        source_code_tgz = github.get_download_url( repo, commit_sha, GHA_USER_TOKEN )
+        if source_code_tgz is None:
+            sys.exit("Couldn't get the redirect location for source code download.")
+        config_vars = heroku.get_pipeline_config_vars( pipeline['id'], 'review', HEADERS_HEROKU_REVIEW_PIPELINES )
+        started = warmpool.fill( missing, app_prefix, app_short_name, team_name, pipeline['id'], source_code_tgz, commit_sha, config_vars, HEADERS_HEROKU )
+        log.info("Started %d of %d pool apps: %s" % (len(started), missing, ', '.join(started)))
+        if len(started) < missing:
+            failed.append(app_short_name)
+
+if dry_run:
+    log.info("Dry run - nothing changed.")
+elif failed:
+    sys.exit("There were problems keeping the pools: %s" % ', '.join(failed))
+
+log.info("Done.")
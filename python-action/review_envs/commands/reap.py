@@ -0,0 +1,153 @@
+# review-envs reap: destroys review environments whose pull request is no longer open.
+# Run by the heroku-env-reaper action.
+
+import collections
+import re
+import sys
+
+from review_envs import cli
+from review_envs import client
+from review_envs import github
+from review_envs import heroku
+from review_envs import log
+from review_envs import okta
+
+# os.environ and sys.argv, unless review-envs serve gave this job its own
+environ = cli.environ()
+argv = cli.argv()
+
+# constants
+PAGE_SIZE = 1000
+
+# tokens
+HEROKU_TOKEN = environ['HEROKU_API_TOKEN']
+GITHUB_TOKEN = environ['GITHUB_TOKEN']
+
+# basic headers for communicating with the Heroku API
+HEADERS_HEROKU = client.heroku_headers( HEROKU_TOKEN, 'review-apps' )
+HEADERS_HEROKU_LIST = client.heroku_headers( HEROKU_TOKEN, 'review-apps', page_size=PAGE_SIZE )
+
+# basic headers for communicating with the GitHub API
+HEADERS_GITHUB = client.github_headers( GITHUB_TOKEN )
+
+# Non-API-Related Functions ####################################################
+
+def get_review_envs( app_names, prefix, origins ):
+    # Groups app names into review environments: {(origin, pr_num): [names]}.
+    # Apps not named {prefix}-{origin}-pr-{num}[-{app}] are left alone, and so
+    # are 30 character names that end in the number - create cuts names to 30
+    # characters, so that number may have lost digits and belong to another PR.
+    pattern = re.compile( r'^%s-(%s)-pr-(\d+)(-.*)?$' % ( re.escape(prefix), '|'.join( re.escape(x) for x in origins ) ) )
+    envs = collections.OrderedDict()
+    for app_name in app_names:
+        m = pattern.match(app_name)
+        if not m:
+            continue
+        if len(app_name) >= 30 and m.group(3) is None:
+            log.warning("Skipping %s: its PR number may have been cut off at 30 characters." % app_name)
+            continue
+        envs.setdefault( (m.group(1), int(m.group(2))), [] ).append(app_name)
+    return envs
+
+# PROCESS ENV and ARGS #########################################################
+
+log.info("Start "+argv[0])
+log.debug("Environment: %s", log.Lazy(log.masked_environment, environ))
+
+# support arguments passed in via the github actions workflow via the syntax
+# args = ["HEROKU_PIPELINE_NAME=github-actions-test"]
+args = {}
+for arg in argv:
+    pair = arg.split('=')
+    if len(pair) > 1:
+        args[pair[0]] = '='.join(pair[1:])
+    else:
+        args[arg] = arg
+
+# for quick testing, we want these to be alternatively passed in via environment
+args_or_envs = [
+    'HEROKU_TEAM_NAME',
+    'APP_PREFIX',
+    'REPOS',
+    'DRY_RUN',
+    'URL_TARGET',
+    'OKTA_API_URL'
+]
+for i in args_or_envs:
+    if i not in args and i in environ:
+        args[i] = environ[i]
+
+log.info("Found arguments: " + str( {k: v for k, v in args.items() if 'TOKEN' not in k and 'SECRET' not in k} ))
+
+# GET THE INPUTS SET UP RIGHT ##################################################
+
+team_name = args['HEROKU_TEAM_NAME']
+app_prefix = args['APP_PREFIX']
+dry_run = args.get('DRY_RUN', 'false').lower() == 'true'
+
+# REPOS lists the originating repos whose environments we reap, separated by
+# |, each optionally followed by %origin when the apps aren't named after the
+# repo: "myorg/real-server%web|myorg/other". Defaults to this repo.
+repos = {}
+for spec in args.get('REPOS', environ.get('GITHUB_REPOSITORY', '')).split('|'):
+    if not spec:
+        continue
+    parts = spec.split('%')
+    repos[ parts[1] if len(parts) > 1 else heroku.get_origin_name( parts[0] ) ] = parts[0]
+if not repos:
+    sys.exit("No repos to reap - set REPOS.")
+log.info("Repos: " + ', '.join( "%s (%s)" % (v, k) for k, v in repos.items() ))
+
+# FIND THE ORPHANED ENVIRONMENTS ###############################################
+
+# one paginated sweep over the team's apps
+app_names = [ x['name'] for x in heroku.list_team_apps( team_name, HEADERS_HEROKU_LIST ) ]
+envs = get_review_envs( app_names, app_prefix, repos.keys() )
+log.info("Found %d apps in team %s, %d review environments." % (len(app_names), team_name, len(envs)))
+
+# one listing of the open pull requests per repo instead of a lookup per app -
+# if any listing fails we stop rather than treat its PRs as closed
+open_prs = {}
+for origin, repo in repos.items():
+    try:
+        open_prs[origin] = set( x['number'] for x in github.list_pulls( repo, HEADERS_GITHUB ) )
+    except RuntimeError as ex:
+        sys.exit(str(ex))
+    log.info("Repo %s has %d open pull requests." % (repo, len(open_prs[origin])))
+
+orphans = [ (key, names) for key, names in envs.items() if key[1] not in open_prs[key[0]] ]
+
+log.info("%-30s %8s %5s" % ('environment', 'pr', 'apps'))
+for (origin, pr_num), names in sorted(envs.items()):
+    log.info("%-30s %8d %5d %s" % ( min(names, key=len), pr_num, len(names), 'open' if pr_num in open_prs[origin] else 'orphaned' ))
+    log.debug("  %s", ', '.join(names))
+
+doomed = [ name for key, names in orphans for name in names ]
+log.info("%d of %d environments are orphaned, %d apps." % (len(orphans), len(envs), len(doomed)))
+
+if dry_run:
+    for name in doomed:
+        log.info("Would delete app %s." % name)
+    log.info("Dry run - nothing deleted.")
+    sys.exit(0)
+
+# DESTROY THEM #################################################################
+
+try:
+    failed = heroku.delete_apps( doomed, HEADERS_HEROKU )
+except ValueError as ex:
+    sys.exit(str(ex))
+deleted = [ x for x in doomed if x not in failed ]
+
+# remove the deleted apps from the Okta whitelist in the same run
+if 'OKTA_API_URL' in args and deleted:
+    url_targets = [ x for x in args['URL_TARGET'].split('|') if x ]
+    uris = [ url % name for name in deleted for url in url_targets ]
+    headers_okta = client.okta_headers( environ['OKTA_API_TOKEN'] )
+    if not okta.update_redirect_uris( args['OKTA_API_URL'], headers_okta, remove=uris ):
+        log.warning("There was a problem removing %d URIs from the Okta whitelist. Please investigate." % len(uris))
+
+if failed:
+    sys.exit("Couldn't delete apps: %s" % ', '.join(failed))
+
+log.info("Done.")
@@ -0,0 +1,779 @@
+# Local stand-in for the Heroku, GitHub and Okta APIs used by the actions.
+#
+# Run it with:
+#
+#   python3 -m review_envs.fakeapi --port 5000 --latency 0.05
+#
+# and point the actions at it:
+#
+#   API_URL_HEROKU=http://localhost:5000
+#   API_URL_GITHUB=http://localhost:5000
+#   OKTA_API_URL=http://localhost:5000/oauth2/v1/clients/review-envs
+#
+# All three APIs are served from one port - their paths don't overlap. State
+# lives in memory. Review apps, app-setups, builds and addons move through
+# their real states after --spawn-delay seconds. Heroku listings honour the
+# Range / Next-Range pagination headers and every GET answers If-None-Match
+# with a 304. Latency, 5xx errors and 429s can be injected, and every call is
+# recorded: GET /__calls returns the log, POST /__reset clears it, and --log
+# writes it to a file on exit. The /__ routes never get injected errors.
+# --port 0 picks a free port; the first line printed says which.
+
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+
+PAGE_SIZE = 200
+
+def new_id():
+    return str(uuid.uuid4())
+
+def now_iso():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+class State:
+    # In-memory data behind the fake APIs. Everything is keyed by id; apps
+    # can also be looked up by name like the real API allows.
+
+    def __init__( self, options ):
+        self.options = options
+        self.lock = threading.RLock()
+        self.calls = []
+        self.team = options.team
+        self.pipelines = {}
+        self.pipeline_config_vars = {}
+        self.apps = {}
+        self.config_vars = {}
+        self.collaborators = {}
+        self.review_apps = {}
+        self.app_setups = {}
+        self.builds = {}
+        self.releases = {}
+        self.slugs = {}
+        self.addons = {}
+        self.attachments = {}
+        self.couplings = {}
+        self.members = [
+            { 'id': new_id(), 'email': 'dev%d@example.com' % i, 'role': 'member' }
+            for i in range(options.members)
+        ]
+        self.members.append({ 'id': new_id(), 'email': 'admin@example.com', 'role': 'admin' })
+        self.pulls = {}
+        self.branches = {}
+        # {repo: {branch: [every sha the branch has pointed at, oldest first]}}
+        self.history = {}
+        self.files = {}
+        self.okta_clients = {
+            'review-envs': {
+                'client_id': 'review-envs',
+                'client_name': 'Review Environments',
+                'client_id_issued_at': 1500000000,
+                'client_secret_expires_at': 0,
+                'redirect_uris': [ 'https://example.com/callback' ]
+            }
+        }
+        for name in options.pipelines:
+            pipeline_id = new_id()
+            self.pipelines[pipeline_id] = { 'id': pipeline_id, 'name': name, 'created_at': now_iso() }
+            self.pipeline_config_vars[pipeline_id] = { 'EXAMPLE_VAR': 'from-pipeline-%s' % name }
+        for repo in options.repos:
+            self.add_repo(repo, options.prs)
+
+    # GitHub ###################################################################
+
+    def add_repo( self, repo, pr_count ):
+        owner = repo.split('/')[0]
+        self.branches[repo] = { 'master': { 'name': 'master', 'commit': { 'sha': hashlib.sha1(repo.encode()).hexdigest() } } }
+        self.history[repo] = { 'master': [ self.branches[repo]['master']['commit']['sha'] ] }
+        self.pulls[repo] = []
+        self.files[repo] = {
+            'app.json': { 'addons': [ 'heroku-redis:mini' ], 'formation': { 'web': { 'quantity': 1, 'size': 'basic' } } }
+        }
+        for number in range(pr_count, 0, -1):
+            branch = 'feature-%d' % number
+            sha = hashlib.sha1(('%s#%d' % (repo, number)).encode()).hexdigest()
+            self.branches[repo][branch] = { 'name': branch, 'commit': { 'sha': sha } }
+            self.history[repo][branch] = [ sha ]
+            self.pulls[repo].append({
+                'number': number,
+                'title': 'Feature %d' % number,
+                'state': 'open' if number > pr_count // 2 else 'closed',
+                'labels': [ { 'name': 'review-env' } ],
+                'head': { 'ref': branch, 'sha': sha, 'label': '%s:%s' % (owner, branch) }
+            })
+
+    # Heroku ###################################################################
+
+    def find_app( self, name_or_id ):
+        app = self.apps.get(name_or_id)
+        if app is None:
+            app = next((x for x in self.apps.values() if x['name'] == name_or_id), None)
+        return app
+
+    def create_app( self, name, team=None, source_blob=None, env=None, stack=None, region=None ):
+        app_id = new_id()
+        app = {
+            'id': app_id,
+            'name': name or 'review-%s' % app_id[:8],
+            'team': { 'name': team or self.team },
+            'stack': { 'name': stack or 'heroku-22' },
+            'region': { 'name': region or 'us' },
+            'web_url': 'https://%s.herokuapp.com/' % name,
+            'created_at': now_iso(),
+            'updated_at': now_iso()
+        }
+        self.apps[app_id] = app
+        self.config_vars[app_id] = dict(env or {})
+        self.collaborators[app_id] = []
+        self.releases[app_id] = []
+        if source_blob:
+            self.create_build(app, source_blob)
+        return app
+
+    def create_build( self, app, source_blob ):
+        build_id = new_id()
+        slug_id = new_id()
+        self.slugs[slug_id] = { 'id': slug_id, 'commit': source_blob.get('version'), 'stack': dict(app['stack']), 'app': { 'id': app['id'] } }
+        self.builds[build_id] = {
+            'id': build_id,
+            'app': { 'id': app['id'] },
+            'status': 'pending',
+            'source_blob': source_blob,
+            'slug': { 'id': slug_id },
+            'created_at': now_iso(),
+            '_ready_at': time.time() + self.options.spawn_delay
+        }
+        return self.builds[build_id]
+
+    def create_release( self, app, slug_id, description ):
+        release = {
+            'id': new_id(),
+            'app': { 'id': app['id'], 'name': app['name'] },
+            'slug': { 'id': slug_id } if slug_id else None,
+            'status': 'succeeded',
+            'current': True,
+            'description': description,
+            'version': len(self.releases[app['id']]) + 1,
+            'created_at': now_iso()
+        }
+        for x in self.releases[app['id']]:
+            x['current'] = False
+        self.releases[app['id']].append(release)
+        return release
+
+    def advance( self ):
+        # move anything that has waited out the spawn delay to its next state
+        now = time.time()
+        for build in self.builds.values():
+            if build['status'] == 'pending' and now >= build['_ready_at']:
+                build['status'] = 'succeeded'
+                app = self.apps.get(build['app']['id'])
+                if app:
+                    self.create_release(app, build['slug']['id'], 'Deploy %s' % (build['source_blob'].get('version') or '')[:7])
+        for reviewapp in self.review_apps.values():
+            if reviewapp['status'] in ( 'pending', 'creating' ) and now >= reviewapp['_ready_at']:
+                if reviewapp['status'] == 'pending':
+                    app = self.create_app(None, source_blob=reviewapp['source_blob'], env=reviewapp['_env'])
+                    reviewapp['app'] = { 'id': app['id'] }
+                    reviewapp['status'] = 'creating'
+                    reviewapp['_ready_at'] = now + self.options.spawn_delay
+                else:
+                    reviewapp['status'] = 'created'
+        for setup in self.app_setups.values():
+            if setup['status'] == 'pending' and now >= setup['_ready_at']:
+                setup['status'] = 'succeeded'
+                setup['build']['status'] = 'succeeded'
+        for addon in self.addons.values():
+            if addon['state'] == 'provisioning' and now >= addon['_ready_at']:
+                addon['state'] = 'provisioned'
+
+def public( value ):
+    # strip our bookkeeping keys (prefixed with _) from response bodies
+    if isinstance(value, dict):
+        return { k: public(v) for k, v in value.items() if not k.startswith('_') }
+    if isinstance(value, list):
+        return [ public(x) for x in value ]
+    return value
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    routes = []
+
+    def log_message( self, format, *args ):
+        if self.server.options.verbose:
+            http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET( self ):
+        self.dispatch('GET')
+
+    def do_POST( self ):
+        self.dispatch('POST')
+
+    def do_PUT( self ):
+        self.dispatch('PUT')
+
+    def do_PATCH( self ):
+        self.dispatch('PATCH')
+
+    def do_DELETE( self ):
+        self.dispatch('DELETE')
+
+    def read_json( self ):
+        if not self.body:
+            return {}
+        return json.loads(self.body.decode('utf-8'))
+
+    def dispatch( self, method ):
+        state = self.server.state
+        options = self.server.options
+        started = time.time()
+        url = urllib.parse.urlsplit(self.path)
+        self.query = dict(urllib.parse.parse_qsl(url.query))
+        # read the body even when an injected error answers instead of the
+        # route - left unread, it would be taken for the connection's next
+        # request
+        self.body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        endpoint = None
+        status = 404
+        body = { 'id': 'not_found', 'message': 'Couldn\'t find that route.' }
+        headers = {}
+
+        if options.latency:
+            time.sleep(options.latency)
+
+        for (route_method, pattern, template, handler) in self.routes:
+            m = pattern.match(url.path)
+            if route_method == method and m:
+                endpoint = template
+                control = template.startswith('/__')
+                if not control and random.random() < options.error_rate:
+                    status, body = 503, { 'id': 'unavailable', 'message': 'Injected error.' }
+                elif not control and random.random() < options.rate_limit_rate:
+                    status, body = 429, { 'id': 'rate_limit', 'message': 'Injected rate limit.' }
+                    headers['Retry-After'] = '%g' % options.retry_after
+                else:
+                    with state.lock:
+                        state.advance()
+                        status, body, extra = handler(self, state, *m.groups())
+                        headers.update(extra or {})
+                break
+
+        payload = b''
+        if body is not None:
+            payload = json.dumps(public(body)).encode('utf-8')
+        if method == 'GET' and status in ( 200, 206 ):
+            etag = '"%s"' % hashlib.md5(payload).hexdigest()
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                status, payload = 304, b''
+        headers['RateLimit-Remaining'] = str(options.rate_limit_remaining)
+
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+        with state.lock:
+            state.calls.append({
+                'method': method,
+                'path': url.path,
+                'endpoint': endpoint,
+                'status': status,
+                'bytes': len(payload),
+                'latency': round(time.time() - started, 4)
+            })
+
+    def paginate( self, items ):
+        # Heroku-style Range pagination on id: "id ..; max=N;" for the first
+        # page, then whatever we handed out as Next-Range
+        items = sorted(items, key=lambda x: x.get('id', ''))
+        header = self.headers.get('Range') or ''
+        m = re.search(r'max=(\d+)', header)
+        size = min(int(m.group(1)), 1000) if m else PAGE_SIZE
+        m = re.match(r'\s*(?:id\s+)?\]([^.]+)\.\.', header)
+        if m:
+            items = [ x for x in items if x.get('id', '') > m.group(1) ]
+        page = items[:size]
+        if len(items) > size:
+            return 206, page, { 'Next-Range': ']%s..; max=%d;' % (page[-1]['id'], size) }
+        return 200, page, {}
+
+def route( method, template ):
+    # "/apps/{app}/config-vars" -> regex with one group per placeholder
+    pattern = re.compile('^' + re.sub(r'\{[^}]+\}', r'([^/]+)', template) + '$')
+    def register( fn ):
+        Handler.routes.append(( method, pattern, template, fn ))
+        return fn
+    return register
+
+def not_found( what ):
+    return 404, { 'id': 'not_found', 'message': 'Couldn\'t find that %s.' % what }, None
+
+# Heroku routes ################################################################
+
+@route('GET', '/pipelines')
+def list_pipelines( handler, state ):
+    return handler.paginate(list(state.pipelines.values()))
+
+@route('GET', '/pipelines/{pipeline}/review-apps')
+def list_review_apps( handler, state, pipeline_id ):
+    return handler.paginate([ x for x in state.review_apps.values() if x['pipeline']['id'] == pipeline_id ])
+
+@route('GET', '/pipelines/{pipeline}/stage/{stage}/config-vars')
+def get_pipeline_config_vars( handler, state, pipeline_id, stage ):
+    return 200, state.pipeline_config_vars.get(pipeline_id, {}), None
+
+@route('POST', '/review-apps')
+def create_review_app( handler, state ):
+    data = handler.read_json()
+    reviewapp = {
+        'id': new_id(),
+        'app': None,
+        'branch': data.get('branch'),
+        'pipeline': { 'id': data.get('pipeline') },
+        'source_blob': data.get('source_blob'),
+        'status': 'pending',
+        'created_at': now_iso(),
+        '_env': data.get('environment') or {},
+        '_ready_at': time.time() + state.options.spawn_delay
+    }
+    state.review_apps[reviewapp['id']] = reviewapp
+    return 201, reviewapp, None
+
+@route('GET', '/review-apps/{id}')
+def get_review_app( handler, state, reviewapp_id ):
+    reviewapp = state.review_apps.get(reviewapp_id)
+    return (200, reviewapp, None) if reviewapp else not_found('review app')
+
+@route('POST', '/app-setups')
+def create_app_setup( handler, state ):
+    data = handler.read_json()
+    app = state.create_app(data['app'].get('name'), data['app'].get('organization'), data.get('source_blob'), (data.get('overrides') or {}).get('env'), data['app'].get('stack'), data['app'].get('region'))
+    build = next(x for x in state.builds.values() if x['app']['id'] == app['id'])
+    setup = {
+        'id': new_id(),
+        'app': { 'id': app['id'], 'name': app['name'] },
+        'build': { 'id': build['id'], 'status': 'pending' },
+        'status': 'pending',
+        'failure_message': None,
+        '_ready_at': build['_ready_at']
+    }
+    state.app_setups[setup['id']] = setup
+    return 202, setup, None
+
+@route('GET', '/app-setups/{id}')
+def get_app_setup( handler, state, setup_id ):
+    setup = state.app_setups.get(setup_id)
+    return (200, setup, None) if setup else not_found('app setup')
+
+@route('GET', '/apps')
+def list_apps( handler, state ):
+    return handler.paginate(list(state.apps.values()))
+
+@route('GET', '/teams/{team}/apps')
+def list_team_apps( handler, state, team ):
+    return handler.paginate([ x for x in state.apps.values() if x['team']['name'] == team ])
+
+@route('POST', '/teams/apps')
+def create_team_app( handler, state ):
+    data = handler.read_json()
+    return 201, state.create_app(data.get('name'), data.get('team'), stack=data.get('stack'), region=data.get('region')), None
+
+@route('GET', '/apps/{app}')
+def get_app( handler, state, name ):
+    app = state.find_app(name)
+    return (200, app, None) if app else not_found('app')
+
+@route('PATCH', '/apps/{app}')
+def update_app( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    data = handler.read_json()
+    if 'name' in data:
+        app['name'] = data['name']
+        app['web_url'] = 'https://%s.herokuapp.com/' % data['name']
+    app['updated_at'] = now_iso()
+    return 200, app, None
+
+@route('DELETE', '/apps/{app}')
+def delete_app( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    del state.apps[app['id']]
+    for addon_id in [ k for k, v in state.addons.items() if v['app']['id'] == app['id'] ]:
+        del state.addons[addon_id]
+    for attachment_id in [ k for k, v in state.attachments.items() if v['app']['id'] == app['id'] or v['addon']['id'] not in state.addons ]:
+        del state.attachments[attachment_id]
+    return 200, app, None
+
+@route('GET', '/apps/{app}/config-vars')
+def get_config_vars( handler, state, name ):
+    app = state.find_app(name)
+    return (200, state.config_vars[app['id']], None) if app else not_found('app')
+
+@route('PATCH', '/apps/{app}/config-vars')
+def update_config_vars( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    config_vars = state.config_vars[app['id']]
+    for k, v in handler.read_json().items():
+        if v is None:
+            config_vars.pop(k, None)
+        else:
+            config_vars[k] = v
+    state.create_release(app, None, 'Set config vars')
+    return 200, config_vars, None
+
+@route('GET', '/apps/{app}/builds')
+def list_builds( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    builds = [ x for x in state.builds.values() if x['app']['id'] == app['id'] ]
+    if 'order=desc' in (handler.headers.get('Range') or ''):
+        builds.reverse()
+    return 200, builds, None
+
+@route('GET', '/apps/{app}/builds/{build}')
+def get_build( handler, state, name, build_id ):
+    build = state.builds.get(build_id)
+    return (200, build, None) if build else not_found('build')
+
+@route('POST', '/apps/{app}/builds')
+def create_build( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    return 201, state.create_build(app, handler.read_json().get('source_blob') or {}), None
+
+@route('GET', '/apps/{app}/releases')
+def list_releases( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    releases = list(state.releases[app['id']])
+    if 'order=desc' in (handler.headers.get('Range') or ''):
+        releases.reverse()
+    return 200, releases, None
+
+@route('POST', '/apps/{app}/releases')
+def create_release( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    data = handler.read_json()
+    if data.get('slug') not in state.slugs:
+        return not_found('slug')
+    return 201, state.create_release(app, data['slug'], data.get('description') or 'Promote slug'), None
+
+@route('GET', '/apps/{app}/slugs/{slug}')
+def get_slug( handler, state, name, slug_id ):
+    slug = state.slugs.get(slug_id)
+    return (200, slug, None) if slug else not_found('slug')
+
+@route('PUT', '/apps/{app}/limits/boot_timeout')
+def set_boot_timeout( handler, state, name ):
+    return 200, { 'name': 'boot_timeout', 'value': handler.read_json().get('value') }, None
+
+@route('PATCH', '/apps/{app}/formation')
+def update_formation( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    return 200, [ dict(x, app={ 'id': app['id'], 'name': app['name'] }) for x in handler.read_json().get('updates', []) ], None
+
+@route('PUT', '/apps/{app}/buildpack-installations')
+def set_buildpacks( handler, state, name ):
+    return 200, [ { 'buildpack': x } for x in handler.read_json().get('updates', []) ], None
+
+@route('POST', '/pipeline-couplings')
+def create_coupling( handler, state ):
+    data = handler.read_json()
+    coupling = { 'id': new_id(), 'app': { 'id': data.get('app') }, 'pipeline': { 'id': data.get('pipeline') }, 'stage': data.get('stage'), 'created_at': now_iso() }
+    state.couplings[coupling['id']] = coupling
+    return 201, coupling, None
+
+@route('GET', '/pipelines/{pipeline}/pipeline-couplings')
+def list_couplings( handler, state, pipeline_id ):
+    return 200, [ x for x in state.couplings.values() if x['pipeline']['id'] == pipeline_id ], None
+
+@route('GET', '/teams/{team}/members')
+def list_members( handler, state, team ):
+    return handler.paginate(state.members)
+
+@route('GET', '/teams/apps/{app}/collaborators')
+def list_collaborators( handler, state, name ):
+    app = state.find_app(name)
+    return handler.paginate(state.collaborators[app['id']]) if app else not_found('app')
+
+@route('GET', '/teams/apps/{app}/collaborators/{email}')
+def get_collaborator( handler, state, name, email ):
+    app = state.find_app(name)
+    collaborator = app and next((x for x in state.collaborators[app['id']] if x['user']['email'] == email), None)
+    return (200, collaborator, None) if collaborator else not_found('collaborator')
+
+def _permissions( names ):
+    return [ { 'name': x } for x in names or [] ]
+
+@route('POST', '/teams/apps/{app}/collaborators')
+def add_collaborator( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    data = handler.read_json()
+    member = next((x for x in state.members if x['email'] == data.get('user')), None)
+    if member and member['role'] == 'admin':
+        return 422, { 'id': 'invalid_params', 'message': '%s is a team admin and cannot be joined on app.' % member['email'] }, None
+    collaborator = { 'id': new_id(), 'app': { 'id': app['id'] }, 'user': { 'email': data.get('user') }, 'permissions': _permissions(data.get('permissions')), 'role': 'member' }
+    state.collaborators[app['id']].append(collaborator)
+    return 201, collaborator, None
+
+@route('PATCH', '/teams/apps/{app}/collaborators/{email}')
+def update_collaborator( handler, state, name, email ):
+    app = state.find_app(name)
+    collaborator = app and next((x for x in state.collaborators[app['id']] if x['user']['email'] == email), None)
+    if not collaborator:
+        return not_found('collaborator')
+    collaborator['permissions'] = _permissions(handler.read_json().get('permissions'))
+    return 200, collaborator, None
+
+@route('POST', '/apps/{app}/addons')
+def create_addon( handler, state, name ):
+    app = state.find_app(name)
+    if not app:
+        return not_found('app')
+    data = handler.read_json()
+    addon_id = new_id()
+    addon = {
+        'id': addon_id,
+        'name': '%s-%s' % (data['plan'].split(':')[0], addon_id[:8]),
+        'app': { 'id': app['id'], 'name': app['name'] },
+        'plan': { 'name': data['plan'] },
+        'config': data.get('config') or {},
+        'state': 'provisioning',
+        '_ready_at': time.time() + state.options.spawn_delay
+    }
+    state.addons[addon_id] = addon
+    attachment_name = (data.get('attachment') or {}).get('name') or data['plan'].split(':')[0].upper()
+    _attach(state, addon, app, attachment_name)
+    return 201, addon, None
+
+def _attach( state, addon, app, name ):
+    attachment = { 'id': new_id(), 'name': name, 'addon': { 'id': addon['id'], 'name': addon['name'], 'app': addon['app'] }, 'app': { 'id': app['id'], 'name': app['name'] } }
+    state.attachments[attachment['id']] = attachment
+    return attachment
+
+def _find_addon( state, name_or_id ):
+    return state.addons.get(name_or_id) or next((x for x in state.addons.values() if x['name'] == name_or_id), None)
+
+@route('GET', '/addons/{addon}')
+def get_addon( handler, state, name ):
+    addon = _find_addon(state, name)
+    return (200, addon, None) if addon else not_found('add-on')
+
+@route('GET', '/apps/{app}/addons')
+def list_app_addons( handler, state, name ):
+    app = state.find_app(name)
+    return (200, [ x for x in state.addons.values() if x['app']['id'] == app['id'] ], None) if app else not_found('app')
+
+@route('DELETE', '/apps/{app}/addons/{addon}')
+def delete_addon( handler, state, name, addon_name ):
+    addon = _find_addon(state, addon_name)
+    if not addon:
+        return not_found('add-on')
+    del state.addons[addon['id']]
+    return 200, addon, None
+
+@route('POST', '/addon-attachments')
+def create_attachment( handler, state ):
+    data = handler.read_json()
+    addon = _find_addon(state, data.get('addon'))
+    app = state.find_app(data.get('app'))
+    if not addon or not app:
+        return not_found('add-on or app')
+    return 201, _attach(state, addon, app, data.get('name')), None
+
+@route('GET', '/apps/{app}/addon-attachments')
+def list_app_attachments( handler, state, name ):
+    app = state.find_app(name)
+    return (200, [ x for x in state.attachments.values() if x['app']['id'] == app['id'] ], None) if app else not_found('app')
+
+@route('GET', '/addons/{addon}/addon-attachments')
+def list_addon_attachments( handler, state, name ):
+    addon = _find_addon(state, name)
+    return (200, [ x for x in state.attachments.values() if x['addon']['id'] == addon['id'] ], None) if addon else not_found('add-on')
+
+# GitHub routes ################################################################
+
+@route('GET', '/repos/{owner}/{repo}/pulls')
+def list_pulls( handler, state, owner, repo ):
+    pulls = state.pulls.get('%s/%s' % (owner, repo), [])
+    if handler.query.get('head'):
+        pulls = [ x for x in pulls if x['head']['label'] == handler.query['head'] ]
+    if handler.query.get('state', 'open') != 'all':
+        pulls = [ x for x in pulls if x['state'] == handler.query.get('state', 'open') ]
+    per_page = int(handler.query.get('per_page', 30))
+    page = int(handler.query.get('page', 1))
+    headers = None
+    if page * per_page < len(pulls):
+        # GitHub-style Link pagination
+        query = dict(handler.query, page=page + 1)
+        next_url = 'http://%s:%d%s?%s' % (handler.server.server_address + (handler.path.split('?')[0], urllib.parse.urlencode(query)))
+        headers = { 'Link': '<%s>; rel="next"' % next_url }
+    return 200, pulls[(page - 1) * per_page:page * per_page], headers
+
+@route('GET', '/repos/{owner}/{repo}/pulls/{number}')
+def get_pull( handler, state, owner, repo, number ):
+    pull = next((x for x in state.pulls.get('%s/%s' % (owner, repo), []) if str(x['number']) == number), None)
+    return (200, pull, None) if pull else not_found('pull request')
+
+@route('GET', '/repos/{owner}/{repo}/branches/{branch}')
+def get_branch( handler, state, owner, repo, branch ):
+    branch = state.branches.get('%s/%s' % (owner, repo), {}).get(urllib.parse.unquote(branch))
+    return (200, branch, None) if branch else not_found('branch')
+
+@route('PATCH', '/repos/{owner}/{repo}/git/refs/heads/{branch}')
+def update_ref( handler, state, owner, repo, branch ):
+    # moves a branch head, as a push would
+    branches = state.branches.setdefault('%s/%s' % (owner, repo), {})
+    name = urllib.parse.unquote(branch)
+    branches[name] = { 'name': name, 'commit': { 'sha': handler.read_json()['sha'] } }
+    state.history.setdefault('%s/%s' % (owner, repo), {}).setdefault(name, []).append(branches[name]['commit']['sha'])
+    return 200, { 'ref': 'refs/heads/' + name, 'object': { 'sha': branches[name]['commit']['sha'], 'type': 'commit' } }, None
+
+@route('GET', '/repos/{owner}/{repo}/compare/{basehead}')
+def compare( handler, state, owner, repo, basehead ):
+    # each branch's history is the shas it has pointed at, in order
+    base, head = urllib.parse.unquote(basehead).split('...')
+    for shas in state.history.get('%s/%s' % (owner, repo), {}).values():
+        if base in shas and head in shas:
+            ahead_by = shas.index(head) - shas.index(base)
+            status = 'identical' if ahead_by == 0 else 'ahead' if ahead_by > 0 else 'behind'
+            return 200, { 'status': status, 'ahead_by': max(ahead_by, 0), 'behind_by': max(-ahead_by, 0) }, None
+    known = [ x for shas in state.history.get('%s/%s' % (owner, repo), {}).values() for x in shas ]
+    if base not in known or head not in known:
+        return not_found('commit')
+    return 200, { 'status': 'diverged', 'ahead_by': 1, 'behind_by': 1 }, None
+
+@route('GET', '/repos/{owner}/{repo}/contents/{path}')
+def get_contents( handler, state, owner, repo, path ):
+    # every ref has the same files - served raw, as for Accept: ...v3.raw
+    contents = state.files.get('%s/%s' % (owner, repo), {}).get(urllib.parse.unquote(path))
+    return (200, contents, None) if contents is not None else not_found('file')
+
+@route('GET', '/repos/{owner}/{repo}/tarball/{ref}')
+def get_tarball( handler, state, owner, repo, ref ):
+    location = 'http://%s:%d/__tarballs/%s/%s/%s.tar.gz' % (handler.server.server_address + (owner, repo, ref))
+    return 302, None, { 'Location': location }
+
+@route('POST', '/graphql')
+def graphql( handler, state ):
+    # Just enough GraphQL for github.prefetch(): aliased repository() fields
+    # selecting either pullRequests(headRefName: ...) or ref(qualifiedName: ...)
+    data = handler.read_json()
+    query, variables = data.get('query', ''), data.get('variables') or {}
+    def value( token ):
+        return variables.get(token[1:]) if token.startswith('$') else token.strip('"')
+    result = {}
+    for m in re.finditer(r'(\w+):\s*repository\(owner:\s*(\S+?),\s*name:\s*(\S+?)\)\s*\{\s*(pullRequests|ref)\((?:headRefName|qualifiedName):\s*(\S+?)[,)]', query):
+        alias, owner, name, field, arg = m.groups()
+        repo = '%s/%s' % (value(owner), value(name))
+        if field == 'pullRequests':
+            pulls = [ x for x in state.pulls.get(repo, []) if x['head']['ref'] == value(arg) ]
+            nodes = [ {
+                'number': x['number'], 'title': x['title'], 'state': x['state'].upper(),
+                'headRefName': x['head']['ref'], 'headRefOid': x['head']['sha'],
+                'labels': { 'nodes': x['labels'] }
+            } for x in pulls[:1] ]
+            result[alias] = { 'pullRequests': { 'nodes': nodes } }
+        else:
+            branch = state.branches.get(repo, {}).get(value(arg)[len('refs/heads/'):])
+            result[alias] = { 'ref': { 'target': { 'oid': branch['commit']['sha'] } } if branch else None }
+    return 200, { 'data': result }, None
+
+@route('POST', '/repos/{owner}/{repo}/issues/{number}/comments')
+def add_comment( handler, state, owner, repo, number ):
+    return 201, { 'id': random.randint(1, 10 ** 9), 'body': handler.read_json().get('body') }, None
+
+# Okta routes ##################################################################
+
+@route('GET', '/oauth2/v1/clients/{client}')
+def get_okta_client( handler, state, client_id ):
+    okta_client = state.okta_clients.get(client_id)
+    return (200, okta_client, None) if okta_client else not_found('client')
+
+@route('PUT', '/oauth2/v1/clients/{client}')
+def put_okta_client( handler, state, client_id ):
+    if client_id not in state.okta_clients:
+        return not_found('client')
+    data = handler.read_json()
+    data['client_id_issued_at'] = state.okta_clients[client_id]['client_id_issued_at']
+    data['client_secret_expires_at'] = state.okta_clients[client_id]['client_secret_expires_at']
+    state.okta_clients[client_id] = data
+    return 200, data, None
+
+# Introspection ################################################################
+
+@route('GET', '/__calls')
+def get_calls( handler, state ):
+    return 200, list(state.calls), None
+
+@route('POST', '/__reset')
+def reset_calls( handler, state ):
+    del state.calls[:]
+    return 200, {}, None
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Heroku, GitHub and Okta APIs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with a 503')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with the injected 429s')
+    parser.add_argument('--rate-limit-remaining', type=int, default=4500, help='RateLimit-Remaining sent on every response')
+    parser.add_argument('--spawn-delay', type=float, default=2.0, help='seconds review apps, builds and addons spend in each pending state')
+    parser.add_argument('--team', default='review-team')
+    parser.add_argument('--members', type=int, default=150, help='number of team members')
+    parser.add_argument('--pipelines', nargs='*', default=['myorg-myapp', 'myorg-myrelatedapp'])
+    parser.add_argument('--repos', nargs='*', default=['myorg/myapp', 'myorg/myrelatedapp'])
+    parser.add_argument('--prs', type=int, default=200, help='number of PRs per repo')
+    parser.add_argument('--log', help='write the call log to this file on exit')
+    parser.add_argument('--verbose', action='store_true')
+    options = parser.parse_args()
+
+    server = Server((options.host, options.port), Handler)
+    server.options = options
+    server.state = State(options)
+    print('Fake Heroku/GitHub/Okta API on http://%s:%d' % server.server_address, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if options.log:
+            with open(options.log, 'w', encoding='utf-8') as log_file:
+                json.dump(server.state.calls, log_file, indent=2)
+            print('Wrote %d calls to %s' % (len(server.state.calls), options.log))
+
+if __name__ == '__main__':
+    main()
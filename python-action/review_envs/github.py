@@ -0,0 +1,188 @@
+# GitHub API helpers shared by the action scripts.
+
+import json
+import re
+import threading
+import traceback
+import urllib.parse
+
+from review_envs import client
+from review_envs import log
+
+# upper bound on the number of pages followed for one listing - 100 pull
+# requests per page
+MAX_PAGES = 100
+
+# in-run memos of pull request and branch head lookups, keyed by (repo, branch)
+_prs = {}
+_lock = threading.Lock()
+_heads = {}
+
+# GraphQL PR states -> REST PR states
+PR_STATES = { 'OPEN': 'open', 'CLOSED': 'closed', 'MERGED': 'closed' }
+
+def reset():
+    # forgets the memoized lookups - PRs and branches move between runs
+    with _lock:
+        _prs.clear()
+        _heads.clear()
+
+def get_pr_by_branch( repo, branch_name, headers ):
+    # Looks up the most recent PR (open or closed) whose head is branch_name,
+    # using the head=org:branch filter so GitHub answers in one request instead
+    # of us paging through every PR in the repo. Returns None if there is none.
+    key = ( repo, branch_name )
+    with _lock:
+        if key in _prs:
+            return _prs[key]
+
+    query = urllib.parse.urlencode({
+        'state': 'all',
+        'head': '%s:%s' % ( repo.split('/')[0], branch_name ),
+        'per_page': 100
+    })
+    r = client.get(client.API_URL_GITHUB+'/repos/'+repo+'/pulls?'+query, headers=headers)
+    prs = json.loads(r.text)
+    if r.status_code != 200 or not isinstance(prs, list):
+        log.warning( "Couldn't list pull requests for %s@%s (%s): %s" % (repo, branch_name, r.status_code, r.text[:200]) )
+        return None
+    pr = next((x for x in prs if x['head']['ref'] == branch_name), None)
+
+    with _lock:
+        _prs[key] = pr
+    return pr
+
+def paginate( url, headers, max_pages=MAX_PAGES ):
+    # Generator over a GitHub listing, following the Link: rel="next" header.
+    # A listing cut off at max_pages raises like a failed one - callers such
+    # as reap must never mistake part of a listing for all of it.
+    for page in range(max_pages):
+        r = client.get( url, headers=headers )
+        results = json.loads(r.text)
+        if r.status_code != 200 or not isinstance(results, list):
+            raise RuntimeError( "Couldn't list %s (%s): %s" % (url, r.status_code, r.text[:200]) )
+        for item in results:
+            yield item
+        if 'next' not in r.links:
+            return
+        url = r.links['next']['url']
+    raise RuntimeError( "Stopped listing %s after %d pages." % (url, max_pages) )
+
+def list_pulls( repo, headers, state='open' ):
+    query = urllib.parse.urlencode({ 'state': state, 'per_page': 100 })
+    return paginate( client.API_URL_GITHUB+'/repos/'+repo+'/pulls?'+query, headers )
+
+def get_download_url( repo, ref, token ):
+    # Heroku wants the 302 location of the tarball, not the API URL - the
+    # token in it gets modified, so it has to be pulled before each build
+    download_url = client.API_URL_GITHUB+'/repos/'+repo+'/tarball/'+urllib.parse.quote(ref)+'?access_token='+token
+    try:
+        r = client.get(download_url, allow_redirects=False)
+        if r.status_code == 302:
+            return r.headers['location']
+    except Exception as ex:
+        log.warning(ex)
+        traceback.print_exc()
+    return None
+
+def get_file( repo, path, ref, headers ):
+    # Returns the raw contents of a file at ref, or None if there is no such
+    # file. The contents at a commit SHA never change, so those may be cached.
+    url = client.API_URL_GITHUB+'/repos/'+repo+'/contents/'+urllib.parse.quote(path)+'?ref='+urllib.parse.quote(ref)
+    cache = True if re.match(r'^[0-9a-f]{40}$', ref) else None
+    r = client.get(url, headers=dict(headers, Accept='application/vnd.github.v3.raw'), cache=cache)
+    return r.text if r.status_code == 200 else None
+
+def get_branch_head( repo, branch_name, headers ):
+    # Returns the SHA at the head of the branch, or None if there is no such
+    # branch. Answered from the prefetch() memo when possible.
+    key = ( repo, branch_name )
+    with _lock:
+        if key in _heads:
+            return _heads[key]
+    r = client.get(client.API_URL_GITHUB+'/repos/'+repo+'/branches/'+urllib.parse.quote(branch_name), headers=headers)
+    branch = json.loads(r.text)
+    sha = branch['commit']['sha'] if r.status_code == 200 else None
+    with _lock:
+        _heads[key] = sha
+    return sha
+
+def compare_commits( repo, base, head, headers ):
+    # How head relates to base: 'identical', 'ahead' when base is in head's
+    # history, 'behind' or 'diverged' - None if GitHub can't compare them. Two
+    # SHAs always compare the same way, so the answer may be cached.
+    url = client.API_URL_GITHUB+'/repos/'+repo+'/compare/'+base+'...'+head+'?per_page=1'
+    cache = True if re.match(r'^[0-9a-f]{40}$', base) and re.match(r'^[0-9a-f]{40}$', head) else None
+    r = client.get(url, headers=headers, cache=cache)
+    if r.status_code != 200:
+        log.warning( "Couldn't compare %s...%s in %s (%s): %s" % (base[:7], head[:7], repo, r.status_code, r.text[:200]) )
+        return None
+    return json.loads(r.text).get('status')
+
+# GraphQL ######################################################################
+
+def graphql( query, variables, headers ):
+    r = client.post(client.API_URL_GITHUB+'/graphql', headers=headers, data=json.dumps({ 'query': query, 'variables': variables }))
+    result = json.loads(r.text)
+    if r.status_code != 200 or result.get('errors') or not result.get('data'):
+        raise RuntimeError( "GraphQL query failed (%s): %s" % (r.status_code, r.text[:200]) )
+    return result['data']
+
+PR_FIELDS = """
+    number title state headRefName headRefOid
+    labels(first: 100) { nodes { name } }
+"""
+
+def prefetch( repo, branch_name, branches, headers ):
+    # One GraphQL round trip for everything a run needs from GitHub: the PR
+    # for repo@branch_name with its labels, plus the head SHA of each
+    # (repo, branch) in `branches`. The results seed the memos behind
+    # get_pr_by_branch() and get_branch_head(). If the query fails those fall
+    # back to their REST calls, so this never has to succeed.
+    branches = list(dict.fromkeys(branches))
+    variables = {
+        'prOwner': repo.split('/')[0], 'prName': repo.split('/')[1],
+        'prBranch': branch_name
+    }
+    fields = [ """
+    pr: repository(owner: $prOwner, name: $prName) {
+        pullRequests(headRefName: $prBranch, first: 1, states: [OPEN, CLOSED, MERGED], orderBy: {field: CREATED_AT, direction: DESC}) {
+            nodes { %s }
+        }
+    }""" % PR_FIELDS ]
+    for i, (head_repo, head_branch) in enumerate(branches):
+        variables['owner%d' % i] = head_repo.split('/')[0]
+        variables['name%d' % i] = head_repo.split('/')[1]
+        variables['ref%d' % i] = 'refs/heads/' + head_branch
+        fields.append( """
+    head%d: repository(owner: $owner%d, name: $name%d) {
+        ref(qualifiedName: $ref%d) { target { oid } }
+    }""" % (i, i, i, i) )
+    query = 'query(%s) {%s\n}' % ( ', '.join( '$%s: String!' % k for k in variables ), ''.join(fields) )
+
+    try:
+        data = graphql( query, variables, headers )
+    except Exception as ex:
+        log.warning( "Couldn't prefetch from GitHub, falling back to REST lookups: %s" % ex )
+        return False
+
+    nodes = ( data.get('pr') or {} ).get('pullRequests', {}).get('nodes') or []
+    pr = None
+    if nodes:
+        node = nodes[0]
+        # shaped like the REST pull request object the scripts already use
+        pr = {
+            'number': node['number'],
+            'title': node['title'],
+            'state': PR_STATES.get(node['state'], node['state'].lower()),
+            'labels': [ { 'name': x['name'] } for x in node['labels']['nodes'] ],
+            'head': { 'ref': node['headRefName'], 'sha': node['headRefOid'] }
+        }
+    with _lock:
+        _prs[( repo, branch_name )] = pr
+        if pr is not None:
+            _heads[( repo, branch_name )] = pr['head']['sha']
+        for i, key in enumerate(branches):
+            ref = ( data.get('head%d' % i) or {} ).get('ref')
+            _heads[key] = ref['target']['oid'] if ref else None
+    return True
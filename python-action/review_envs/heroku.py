@@ -0,0 +1,152 @@
+# Heroku API helpers shared by the action scripts.
+
+import concurrent.futures
+import json
+
+from review_envs import client
+from review_envs import log
+from review_envs import trace
+
+# upper bound on the number of Range pages we will follow for one listing -
+# with 200 items per page this is 20k items, far beyond any real pipeline
+MAX_PAGES = 100
+
+# concurrent app deletions when tearing down environments
+DELETE_WORKERS = 8
+
+def paginate( url, headers, max_pages=MAX_PAGES, **kwargs ):
+    # Generator over a Range-paginated Heroku listing. Items are yielded page by
+    # page so callers can stop at the first match without downloading the rest,
+    # and only one page is held in memory at a time.
+    headers = dict(headers)
+    for page in range(max_pages):
+        log.debug( "GET %s (Range: '%s')", url, headers.get('Range', '') )
+        r = client.get( url, headers=headers, **kwargs )
+        results = json.loads(r.text)
+        if not isinstance(results, list):
+            log.warning( "Unexpected response listing %s (%s): %s" % (url, r.status_code, r.text[:200]) )
+            return
+        for item in results:
+            yield item
+        if r.status_code != 206 or 'Next-Range' not in r.headers:
+            return
+        headers['Range'] = r.headers['Next-Range']
+    log.warning( "Stopped listing %s after %d pages." % (url, max_pages) )
+
+def paginated_get_json_array( url, headers, **kwargs ):
+    return list(paginate( url, headers, **kwargs ))
+
+def rename_app( app_id_or_name, app_name, headers ):
+    r = client.patch( client.API_URL_HEROKU+'/apps/'+app_id_or_name, headers=headers, data=json.dumps( {'name': app_name[:30]} ) )
+    return r.status_code == 200
+
+def get_current_slug( app_id, headers ):
+    # The slug the app is running: the newest succeeded release that carries
+    # one. Returns None for an app that has never been deployed.
+    releases_headers = dict(headers, Range='version ..; order=desc, max=10;')
+    r = client.get( client.API_URL_HEROKU+'/apps/'+app_id+'/releases', headers=releases_headers )
+    releases = json.loads(r.text)
+    if not isinstance(releases, list):
+        return None
+    release = next(( x for x in releases if x.get('status') == 'succeeded' and x.get('slug') ), None)
+    if release is None:
+        return None
+    r = client.get( client.API_URL_HEROKU+'/apps/'+app_id+'/slugs/'+release['slug']['id'], headers=headers )
+    slug = json.loads(r.text)
+    return slug if r.status_code == 200 else None
+
+def get_deployed_commit( app_id, headers ):
+    # the commit SHA of the code the app is running, or None
+    slug = get_current_slug( app_id, headers )
+    return slug.get('commit') if slug else None
+
+def release_slug( app_id, slug_id, headers, description=None ):
+    # releases a slug that was built by any app we can see - no build needed
+    payload = { 'slug': slug_id }
+    if description:
+        payload['description'] = description
+    r = client.post( client.API_URL_HEROKU+'/apps/'+app_id+'/releases', headers=headers, data=json.dumps(payload) )
+    release = json.loads(r.text)
+    return release if 'id' in release else None
+
+def deploy_to_app( app_id, source_code_tgz_url, commit_sha, headers ):
+    # starts a build of the tarball on the app and returns it, or None
+    payload = {
+        'source_blob': {
+            'url': source_code_tgz_url,
+            'version': commit_sha,
+        },
+    }
+    r = client.post( client.API_URL_HEROKU+'/apps/'+app_id+'/builds', headers=headers, data=json.dumps(payload) )
+    build = json.loads(r.text)
+    return build if 'id' in build else None
+
+def get_pipelines( headers ):
+    r = client.get( client.API_URL_HEROKU+'/pipelines', headers=headers, cache=True )
+    return json.loads(r.text)
+
+def get_pipeline_by_name( pipeline_name, headers, pipelines=None ):
+    # pipelines is a listing the caller already holds, e.g. one memoized for
+    # the run - otherwise it is fetched
+    if pipelines is None:
+        pipelines = get_pipelines( headers )
+    if not isinstance(pipelines, list):
+        return None
+    return next(( x for x in pipelines if x.get('name') == pipeline_name and 'id' in x ), None)
+
+def get_pipeline_config_vars( pipeline_id, stage, headers ):
+    # the config vars the pipeline gives its apps in the stage - never cached,
+    # they hold the apps' secrets
+    r = client.get( client.API_URL_HEROKU+'/pipelines/'+pipeline_id+'/stage/'+stage+'/config-vars', headers=headers )
+    return json.loads(r.text)
+
+def get_pipeline_couplings( pipeline_id, headers ):
+    return paginated_get_json_array( client.API_URL_HEROKU+'/pipelines/'+pipeline_id+'/pipeline-couplings', headers )
+
+def get_origin_name( repo ):
+    # the originating app is named after the repo, with a couple of exceptions
+    name = repo.split('/')[-1]
+    if name == "real-server":
+        return "web"
+    if name == "inventory-service":
+        return "inventory"
+    return name
+
+def list_team_apps( team_name, headers ):
+    # every app of the team, one Range page at a time
+    return paginate( client.API_URL_HEROKU+'/teams/'+team_name+'/apps', headers )
+
+def delete_app( app_name, headers ):
+    # Heroku deprovisions the addons the app owns along with it
+    if '-pr-' not in app_name:
+        raise ValueError("Tried to delete app "+app_name+" - refusing for safety's sake.")
+    r = client.delete( client.API_URL_HEROKU+'/apps/'+app_name, headers=headers )
+    log.debug( "Deleted %s (%s): %s", app_name, r.status_code, log.Lazy(log.truncate, r.text) )
+    # an app that is already gone is as good as deleted
+    return r.status_code in ( 200, 202, 204, 404 )
+
+def delete_apps( app_names, headers, workers=DELETE_WORKERS ):
+    # Deletes the apps in parallel and returns the names that failed. The
+    # '-pr-' guard is checked for every app before anything is deleted.
+    for app_name in app_names:
+        if '-pr-' not in app_name:
+            raise ValueError("Tried to delete app "+app_name+" - refusing for safety's sake.")
+    failed = []
+    if not app_names:
+        return failed
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        delete = trace.propagate( delete_app )
+        futures = { pool.submit( delete, x, headers ): x for x in app_names }
+        for future in concurrent.futures.as_completed(futures):
+            app_name = futures[future]
+            try:
+                deleted = future.result()
+            except Exception as ex:
+                log.warning(ex)
+                deleted = False
+            if deleted:
+                log.info( "Deleted app %s." % app_name )
+            else:
+                log.warning( "Couldn't delete app %s." % app_name )
+                failed.append(app_name)
+    return failed
@@ -0,0 +1,163 @@
+# Opt-in on-disk cache for slow-changing GET responses, shared across runs.
+#
+#   HTTP_CACHE_DIR=path           enable the cache and keep it here - point it
+#                                 at a directory saved with actions/cache
+#   HTTP_CACHE_TTL=300            seconds a response is served without asking
+#   HTTP_CACHE_MAX_BYTES=52428800 total size kept, least recently used go first
+#
+# Only calls made with cache=... go through the cache - see client.request().
+# A fresh entry is answered locally. A stale entry that has an ETag is
+# revalidated with If-None-Match, and a 304 serves the stored body. Entries
+# are keyed by the URL, the headers that change the response (Accept, Range)
+# and a hash of the Authorization header, so tokens with different access
+# never share entries and no token is written to disk.
+
+import atexit
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from review_envs import log
+from review_envs import trace
+
+DIRECTORY = os.environ.get('HTTP_CACHE_DIR')
+ENABLED = bool(DIRECTORY)
+TTL = float(os.environ.get('HTTP_CACHE_TTL', '300'))
+MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# response headers worth keeping - enough for pagination and revalidation
+KEPT_HEADERS = ( 'Content-Range', 'Content-Type', 'ETag', 'Link', 'Next-Range' )
+
+# request headers that select a different response for the same URL
+VARY_HEADERS = ( 'Accept', 'Range' )
+
+stats = collections.Counter()
+_lock = threading.Lock()
+_size = None
+
+def configure( directory ):
+    # enables the cache at runtime, e.g. for the long-running webhook server
+    global DIRECTORY, ENABLED, _size
+    with _lock:
+        DIRECTORY = directory
+        ENABLED = bool(directory)
+        _size = None
+
+def _key( url, headers ):
+    headers = CaseInsensitiveDict(headers or {})
+    scope = hashlib.sha256( headers.get('Authorization', '').encode('utf-8') ).hexdigest()
+    vary = '\n'.join( '%s: %s' % (x, headers.get(x, '')) for x in VARY_HEADERS )
+    return hashlib.sha256( '\n'.join([ url, vary, scope ]).encode('utf-8') ).hexdigest()
+
+def _path( key ):
+    return os.path.join( DIRECTORY, key[:2], key + '.json' )
+
+def _load( path ):
+    try:
+        with open(path, 'r', encoding='utf-8') as entry_file:
+            entry = json.load(entry_file)
+        # reading counts as a use for the LRU eviction
+        os.utime(path)
+        return entry
+    except (OSError, ValueError):
+        return None
+
+def _store( path, entry ):
+    global _size
+    # private to this user, like the entries mkstemp writes
+    os.makedirs( os.path.dirname(path), mode=0o700, exist_ok=True )
+    data = json.dumps(entry).encode('utf-8')
+    # write-then-rename so concurrent runs and threads never read half an entry
+    fd, temp = tempfile.mkstemp( dir=os.path.dirname(path) )
+    with os.fdopen(fd, 'wb') as entry_file:
+        entry_file.write(data)
+    os.replace(temp, path)
+    with _lock:
+        if _size is None:
+            _size = _disk_usage()
+        else:
+            _size += len(data)
+        if _size > MAX_BYTES:
+            _evict()
+
+def _entries():
+    for root, _, files in os.walk(DIRECTORY):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            yield ( info.st_mtime, info.st_size, path )
+
+def _disk_usage():
+    return sum( x[1] for x in _entries() )
+
+def _evict():
+    # drop the least recently used entries until we're at 90% of the budget
+    global _size
+    entries = sorted(_entries())
+    _size = sum( x[1] for x in entries )
+    for mtime, size, path in entries:
+        if _size <= MAX_BYTES * 0.9:
+            break
+        try:
+            os.remove(path)
+            _size -= size
+            stats['evicted'] += 1
+        except OSError:
+            pass
+
+def _response( url, entry ):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+def get( send, url, headers, ttl=None ):
+    # Answers a GET from the cache where possible. send(headers) makes the
+    # real request and returns the response.
+    ttl = TTL if ttl is None or ttl is True else ttl
+    path = _path(_key( url, headers ))
+    entry = _load(path)
+    now = time.time()
+    if entry is not None and now - entry['stored_at'] < ttl:
+        stats['hits'] += 1
+        return _response( url, entry )
+
+    if entry is not None and entry['headers'].get('ETag'):
+        headers = dict(headers or {})
+        headers['If-None-Match'] = entry['headers']['ETag']
+    r = send(headers)
+
+    if r.status_code == 304 and entry is not None:
+        stats['revalidated'] += 1
+        entry['stored_at'] = now
+        _store( path, entry )
+        return _response( url, entry )
+    stats['misses'] += 1
+    if r.status_code in ( 200, 206 ):
+        _store( path, {
+            'url': url,
+            'status': r.status_code,
+            'headers': { k: r.headers[k] for k in KEPT_HEADERS if k in r.headers },
+            'body': r.text,
+            'stored_at': now
+        })
+    return r
+
+def report():
+    log.info( "HTTP cache: %d hits, %d revalidated, %d misses, %d evicted (%s)" % (stats['hits'], stats['revalidated'], stats['misses'], stats['evicted'], DIRECTORY) )
+
+if ENABLED and trace.ENABLED:
+    atexit.register(report)
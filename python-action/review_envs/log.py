@@ -0,0 +1,92 @@
+# Leveled logging for the action scripts.
+#
+#   LOG_LEVEL=DEBUG|INFO|WARNING|ERROR   default INFO
+#   LOG_FORMAT=json                      one JSON object per line
+#   LOG_MAX_CHARS=2000                   truncate serialized objects
+#
+# Big objects (API responses, payloads, the environment) are wrapped in
+# lazy_json()/Lazy() so they are only serialized when the message is actually
+# emitted - at the default INFO level a debug dump costs nothing.
+
+import json
+import logging
+import os
+import sys
+import time
+
+LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+MAX_CHARS = int(os.environ.get('LOG_MAX_CHARS', '2000'))
+
+class TextFormatter(logging.Formatter):
+
+    def format( self, record ):
+        # INFO reads like the plain prints the actions always had
+        message = record.getMessage()
+        if record.levelno == logging.INFO:
+            return message
+        return '%s: %s' % ( record.levelname, message )
+
+class JsonFormatter(logging.Formatter):
+
+    def format( self, record ):
+        return json.dumps({
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(record.created)),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        })
+
+logger = logging.getLogger('review_envs')
+logger.setLevel(getattr(logging, LEVEL, logging.INFO))
+logger.propagate = False
+if not logger.handlers:
+    # stdout, where the actions' output has always gone
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter() if FORMAT == 'json' else TextFormatter())
+    logger.addHandler(_handler)
+
+debug = logger.debug
+info = logger.info
+warning = logger.warning
+error = logger.error
+
+def enabled( level ):
+    return logger.isEnabledFor(getattr(logging, level.upper()))
+
+class Lazy:
+    # defers fn(*args) until the log record is formatted
+
+    def __init__( self, fn, *args ):
+        self.fn = fn
+        self.args = args
+
+    def __str__( self ):
+        return str(self.fn(*self.args))
+
+def truncate( text, limit=None ):
+    limit = MAX_CHARS if limit is None else limit
+    if limit and len(text) > limit:
+        return '%s... (%d more chars)' % ( text[:limit], len(text) - limit )
+    return text
+
+def _json( obj ):
+    return truncate(json.dumps(obj, sort_keys=True, indent=4, default=str))
+
+def lazy_json( obj ):
+    return Lazy(_json, obj)
+
+def summary( obj ):
+    # one line that identifies an API object without dumping all of it
+    if isinstance(obj, list):
+        return '[%d items]' % len(obj)
+    if isinstance(obj, dict):
+        keys = [ k for k in ( 'id', 'name', 'status', 'state', 'message' ) if obj.get(k) is not None ]
+        return '{%s}' % ', '.join( '%s: %s' % (k, obj[k]) for k in keys ) if keys else '{%d keys}' % len(obj)
+    return truncate(str(obj), 200)
+
+def lazy_summary( obj ):
+    return Lazy(summary, obj)
+
+def masked_environment( environ=None ):
+    return { k: '***' if 'TOKEN' in k or 'SECRET' in k else v for k, v in (environ or os.environ).items() }
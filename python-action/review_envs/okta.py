@@ -0,0 +1,72 @@
+# Okta OAuth client helpers shared by the okta-whitelist-url-* actions.
+
+import json
+import random
+import time
+
+from review_envs import client
+from review_envs import log
+
+# fields Okta sets itself and rejects on PUT
+READ_ONLY_FIELDS = [ 'client_secret_expires_at', 'client_id_issued_at' ]
+MAX_ATTEMPTS = 6
+RETRY_DELAY = 1.0
+
+def get_client( api_url_okta, headers ):
+    r = client.get(api_url_okta, headers=headers)
+    if r.status_code != 200:
+        log.warning( "Couldn't read the Okta client (%s): %s" % (r.status_code, r.text[:200]) )
+        return None
+    return json.loads(r.text)
+
+def put_client( api_url_okta, headers, okta_client ):
+    body = { k: v for k, v in okta_client.items() if k not in READ_ONLY_FIELDS }
+    r = client.put(api_url_okta, headers=headers, data=json.dumps(body))
+    if r.status_code != 200:
+        log.warning( "Couldn't update the Okta client (%s): %s" % (r.status_code, r.text[:200]) )
+    return r.status_code == 200
+
+def update_redirect_uris( api_url_okta, headers, add=(), remove=() ):
+    # Adds and removes redirect URIs on the Okta client in a single
+    # read-modify-write. Okta has no conditional PUT, so when several actions
+    # update the client at once we re-read right before writing and start over
+    # if the list moved under us, then re-read after writing to make sure our
+    # change wasn't overwritten by a concurrent writer. Returns True once the
+    # client has every URI in `add` and none of `remove`.
+    add = list(dict.fromkeys(add))
+    remove = set(remove)
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep( RETRY_DELAY * attempt * random.uniform(0.5, 1.5) )
+
+        okta_client = get_client( api_url_okta, headers )
+        if okta_client is None:
+            continue
+        current = okta_client['redirect_uris']
+        current_set = set(current)
+        to_add = [ x for x in add if x not in current_set ]
+        to_remove = remove & current_set
+        if not to_add and not to_remove:
+            log.info( "Okta client already has the requested redirect URIs." )
+            return True
+
+        for uri in to_add:
+            log.info( "Adding %s to the Okta client." % uri )
+        for uri in sorted(to_remove):
+            log.info( "Removing %s from the Okta client." % uri )
+        okta_client['redirect_uris'] = [ x for x in current if x not in to_remove ] + to_add
+
+        latest = get_client( api_url_okta, headers )
+        if latest is None or latest['redirect_uris'] != current:
+            log.warning( "The Okta client changed while we were updating it - retrying." )
+            continue
+        if not put_client( api_url_okta, headers, okta_client ):
+            continue
+
+        written = get_client( api_url_okta, headers )
+        if written is not None:
+            written_set = set(written['redirect_uris'])
+            if all( x in written_set for x in add ) and not ( written_set & remove ):
+                return True
+        log.warning( "Our Okta client update was overwritten by a concurrent update - retrying." )
+    return False
@@ -0,0 +1,108 @@
+# Token-bucket request scheduler shared by every call made in a run.
+#
+# Each API host gets one bucket. Tokens refill at the host's documented rate
+# and are re-synced with whatever budget the API reports back (Heroku's
+# RateLimit-Remaining, GitHub's X-RateLimit-Remaining / X-RateLimit-Reset), so
+# when the shared service token runs low every worker in the run slows down
+# together instead of failing halfway through an environment.
+
+import threading
+import time
+import urllib.parse
+
+# requests per hour, per host - anything else gets the default
+HOURLY_LIMITS = {
+    'api.heroku.com': 4500,
+    'api.github.com': 5000,
+}
+DEFAULT_HOURLY_LIMIT = 3600
+
+# how long to back off on a 429 that doesn't say how long to wait
+DEFAULT_RETRY_AFTER = 5
+MAX_RETRY_AFTER = 15 * 60
+
+class TokenBucket:
+
+    def __init__( self, rate, capacity ):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def _refill( self, now ):
+        self.tokens = min( self.capacity, self.tokens + (now - self.updated) * self.rate )
+        self.updated = now
+
+    def acquire( self ):
+        # blocks until a request may be sent
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.paused_until - now
+                if delay <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def sync( self, remaining, reset_in=None ):
+        # the server knows the real budget - never think we have more than it
+        # says, and if it's gone, wait for the window to reset
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min( self.tokens, remaining )
+            if remaining < 1 and reset_in is not None:
+                self.paused_until = max( self.paused_until, now + min(reset_in, MAX_RETRY_AFTER) )
+
+    def pause( self, seconds ):
+        with self.lock:
+            self.paused_until = max( self.paused_until, time.monotonic() + min(seconds, MAX_RETRY_AFTER) )
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def bucket_for( url ):
+    host = urllib.parse.urlsplit(url).netloc
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            hourly = HOURLY_LIMITS.get(host, DEFAULT_HOURLY_LIMIT)
+            bucket = TokenBucket( hourly / 3600.0, hourly )
+            _buckets[host] = bucket
+        return bucket
+
+def _header_number( headers, name ):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def retry_after( response ):
+    # seconds to wait before retrying a throttled response, or None if the
+    # response wasn't throttled
+    throttled = response.status_code == 429 or (
+        response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0' )
+    if not throttled:
+        return None
+    seconds = _header_number( response.headers, 'Retry-After' )
+    if seconds is None:
+        reset = _header_number( response.headers, 'X-RateLimit-Reset' )
+        if reset is not None:
+            seconds = reset - time.time()
+    if seconds is None or seconds < 0:
+        seconds = DEFAULT_RETRY_AFTER
+    return min( seconds, MAX_RETRY_AFTER )
+
+def observe( bucket, response ):
+    # feed the budget reported by the API back into the bucket
+    remaining = _header_number( response.headers, 'RateLimit-Remaining' )
+    if remaining is None:
+        remaining = _header_number( response.headers, 'X-RateLimit-Remaining' )
+    if remaining is not None:
+        reset = _header_number( response.headers, 'X-RateLimit-Reset' )
+        bucket.sync( remaining, reset - time.time() if reset is not None else None )
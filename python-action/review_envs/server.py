@@ -0,0 +1,240 @@
+# review-envs serve: receives GitHub pull_request webhooks and runs the
+# review-envs commands in-process, instead of one container per workflow step.
+#
+#   review-envs serve --config steps.json [--port 8080] [--workers 4] [--cache-dir dir]
+#
+# The config maps each repo to the steps its PR events run, in order:
+#
+#   {
+#     "myorg/myapp": [
+#       { "on": ["opened", "reopened", "synchronize", "labeled"],
+#         "run": "create", "args": { "APP_PREFIX": "myorg", "APP_NAME": "myapp", ... } },
+#       { "on": ["closed"],
+#         "run": "destroy", "args": { "APP_PREFIX": "myorg", "APP_ORIGIN": "myapp", "TEARDOWN": "true", ... } }
+#     ]
+#   }
+#
+# Each job gets the webhook payload as its GITHUB_EVENT_PATH and the same
+# GITHUB_* variables the Actions runner sets, so the commands parse it exactly
+# as they parse GH_EVENT in a workflow. Tokens come from the server's own
+# environment. Deliveries are checked against WEBHOOK_SECRET.
+#
+# What stays warm between jobs is the pooled keep-alive sessions in
+# review_envs.client, the rate limit buckets and the HTTP cache, which is kept
+# in --cache-dir (a temporary directory by default). Each job re-runs its
+# command's module, so the lookups a command memoizes for itself start over.
+#
+# Jobs for different PRs run at the same time, up to --workers of them - the
+# commands read their inputs through cli.environ() and cli.argv(), which are
+# per thread. A PR only ever has one job running. A newer event for a PR whose
+# job is still queued replaces the queued one, and an event for a PR whose job
+# is running waits for it.
+
+import argparse
+import collections
+import hashlib
+import hmac
+import http.server
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from review_envs import cli
+from review_envs import github
+from review_envs import httpcache
+from review_envs import log
+
+NEUTRAL_EXIT_CODE = 78
+DEFAULT_WORKERS = 4
+
+# Jobs #########################################################################
+
+class Jobs:
+
+    def __init__( self, config, event_dir ):
+        self.config = config
+        self.event_dir = event_dir
+        # {(repo, number): (payload, steps)}, oldest first
+        self.pending = collections.OrderedDict()
+        self.running = set()
+        self.changed = threading.Condition()
+        self.history = collections.deque(maxlen=50)
+
+    def submit( self, payload ):
+        # queues the steps for a PR event - returns how many steps matched
+        repo = payload['repository']['full_name']
+        action = payload.get('action')
+        steps = [ x for x in self.config.get(repo, []) if action in x.get('on', []) ]
+        if not steps:
+            return 0
+        key = ( repo, payload['number'] )
+        with self.changed:
+            replaced = key in self.pending
+            self.pending[key] = ( payload, steps )
+            self.changed.notify()
+        if replaced:
+            log.info( "Replaced the queued job for %s#%s with the %s event." % (repo, payload['number'], action) )
+        return len(steps)
+
+    def take( self ):
+        # blocks until a queued job's PR has nothing else running, then takes it
+        with self.changed:
+            while True:
+                key = next(( x for x in self.pending if x not in self.running ), None)
+                if key is not None:
+                    self.running.add(key)
+                    return key, self.pending.pop(key)
+                self.changed.wait()
+
+    def work( self ):
+        while True:
+            key, ( payload, steps ) = self.take()
+            try:
+                self.run( payload, steps )
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self.changed:
+                    self.running.discard(key)
+                    self.changed.notify_all()
+
+    def status( self ):
+        with self.changed:
+            return {
+                'queued': [ '%s#%s' % x for x in self.pending ],
+                'running': sorted( '%s#%s' % x for x in self.running ),
+                'history': list(self.history)
+            }
+
+    def run( self, payload, steps ):
+        repo = payload['repository']['full_name']
+        pr = payload['pull_request']
+        event_path = os.path.join( self.event_dir, 'event-%s-%s.json' % (repo.replace('/', '-'), payload['number']) )
+        with open(event_path, 'w', encoding='utf-8') as event_file:
+            json.dump(payload, event_file)
+        environ = {
+            'GITHUB_EVENT_NAME': 'pull_request',
+            'GITHUB_EVENT_PATH': event_path,
+            'GITHUB_REPOSITORY': repo,
+            'GITHUB_REF': 'refs/heads/' + pr['head']['ref'],
+            'GITHUB_SHA': pr['head']['sha']
+        }
+        # PR labels, state and branch heads change from one event to the next
+        github.reset()
+        for step in steps:
+            start = time.monotonic()
+            code, message = run_command( step['run'], step.get('args', {}), environ )
+            result = 'ok' if code in ( 0, None ) else 'neutral' if code == NEUTRAL_EXIT_CODE else 'failed (%s)' % code
+            if message:
+                result += ': ' + message
+            seconds = time.monotonic() - start
+            log.info( "%s#%s %s %s: %s in %.1fs" % (repo, payload['number'], payload['action'], step['run'], result, seconds) )
+            self.history.append({ 'repo': repo, 'pr': payload['number'], 'action': payload['action'], 'run': step['run'], 'result': result, 'seconds': round(seconds, 1) })
+            if result.startswith('failed'):
+                # later steps build on the earlier ones, like needs = [...]
+                break
+
+def run_command( command, args, environ ):
+    # Runs one command in this thread. Returns its exit code, and the message
+    # it exited with, if any - sys.exit("...") exits with 1.
+    try:
+        cli.run( command, [ '%s=%s' % (k, v) for k, v in args.items() ], environ )
+        return 0, None
+    except SystemExit as ex:
+        if isinstance(ex.code, int) or ex.code is None:
+            return ex.code, None
+        return 1, str(ex.code)
+    except Exception as ex:
+        traceback.print_exc()
+        return 1, str(ex)
+
+# Webhooks #####################################################################
+
+def verify( secret, body, signature ):
+    if secret is None:
+        return True
+    expected = 'sha256=' + hmac.new( secret.encode('utf-8'), body, hashlib.sha256 ).hexdigest()
+    return hmac.compare_digest( expected, signature or '' )
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def respond( self, status, body ):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET( self ):
+        self.respond( 200, self.server.jobs.status() )
+
+    def do_POST( self ):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not verify( self.server.secret, body, self.headers.get('X-Hub-Signature-256') ):
+            return self.respond( 401, { 'message': 'bad signature' } )
+        event = self.headers.get('X-GitHub-Event')
+        if event == 'ping':
+            return self.respond( 200, { 'message': 'pong' } )
+        if event != 'pull_request':
+            return self.respond( 202, { 'message': 'ignored %s event' % event } )
+        try:
+            payload = json.loads(body.decode('utf-8'))
+            steps = self.server.jobs.submit( payload )
+        except (ValueError, KeyError) as ex:
+            return self.respond( 400, { 'message': 'bad payload: %s' % ex } )
+        # answer right away - GitHub gives up on deliveries after 10 seconds
+        self.respond( 202, { 'steps': steps } )
+
+    def log_message( self, format, *args ):
+        pass
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(prog='review-envs serve', description='Run the review-envs commands from GitHub pull_request webhooks.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--config', required=True, help='JSON file mapping repos to the steps their PR events run')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='jobs to run at the same time (default: %d)' % DEFAULT_WORKERS)
+    parser.add_argument('--cache-dir', help='keep the HTTP cache here (default: a temporary directory)')
+    parser.add_argument('--no-verify', action='store_true', help='accept deliveries without a signature - for local testing only')
+    options = parser.parse_args(sys.argv[1:])
+
+    secret = os.environ.get('WEBHOOK_SECRET')
+    if secret is None and not options.no_verify:
+        sys.exit("Set WEBHOOK_SECRET to the webhook's secret, or pass --no-verify for local testing.")
+
+    with open(options.config, 'r', encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    for repo, steps in config.items():
+        for step in steps:
+            if step.get('run') not in cli.COMMANDS or step['run'] == 'serve':
+                sys.exit("Unknown command %s for %s." % (step.get('run'), repo))
+
+    if not httpcache.ENABLED:
+        httpcache.configure( options.cache_dir or tempfile.mkdtemp(prefix='review-envs-cache-') )
+
+    jobs = Jobs( config, tempfile.mkdtemp(prefix='review-envs-events-') )
+    for i in range(options.workers):
+        threading.Thread(target=jobs.work, name='review-envs-jobs-%d' % i, daemon=True).start()
+
+    server = Server((options.host, options.port), Handler)
+    server.jobs = jobs
+    server.secret = None if options.no_verify else secret
+    log.info( "review-envs serving webhooks for %s on http://%s:%d (HTTP cache in %s)" % (', '.join(config), options.host, options.port, httpcache.DIRECTORY) )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
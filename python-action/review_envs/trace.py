@@ -0,0 +1,192 @@
+# Opt-in per-request tracing and profiling.
+#
+#   TRACE=true          record every API call and print a summary at exit
+#   TRACE_FILE=path     ...and also write the calls and summary as JSON
+#   PROFILE=cprofile    run under cProfile, print the top functions at exit
+#                       and write the stats to PROFILE_FILE
+#   PROFILE=sample      sample every thread's stack every PROFILE_INTERVAL
+#                       seconds and write folded stacks (flamegraph.pl
+#                       format) to PROFILE_FILE
+#
+# Calls are tagged with the phase they ran in - see phase() - so the summary
+# shows where the minutes of a run actually went.
+
+import atexit
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+from review_envs import log
+
+TRACE_FILE = os.environ.get('TRACE_FILE')
+ENABLED = bool(TRACE_FILE) or os.environ.get('TRACE', '').lower() == 'true'
+PROFILE = os.environ.get('PROFILE', '').lower()
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.01'))
+
+# path segments following one of these are ids/names and get templated away
+COLLECTIONS = set([
+    'addons', 'app-setups', 'apps', 'branches', 'builds', 'clients', 'collaborators',
+    'comments', 'issues', 'members', 'pipelines', 'pulls', 'releases', 'repos',
+    'review-apps', 'slugs', 'stage', 'tarball', 'teams'
+])
+
+_calls = []
+_calls_lock = threading.Lock()
+_local = threading.local()
+_started = time.monotonic()
+
+# Phases #######################################################################
+
+def current_phase():
+    return getattr(_local, 'phase', 'main')
+
+@contextlib.contextmanager
+def phase( name ):
+    previous = current_phase()
+    _local.phase = name
+    try:
+        yield
+    finally:
+        _local.phase = previous
+
+def set_phase( name ):
+    _local.phase = name
+
+def propagate( fn ):
+    # wraps fn so it runs in the caller's phase - use when handing work to a
+    # thread pool, since phases are tracked per thread
+    name = current_phase()
+    def run( *args, **kwargs ):
+        with phase(name):
+            return fn(*args, **kwargs)
+    return run
+
+# Calls ########################################################################
+
+def endpoint( url ):
+    # /apps/myorg-web-pr-12/config-vars -> /apps/{apps}/config-vars
+    segments = urllib.parse.urlsplit(url).path.split('/')
+    templated = []
+    owner = False
+    for i, segment in enumerate(segments):
+        previous = segments[i - 1] if i else ''
+        if owner:
+            templated.append('{repo}')
+            owner = False
+        elif previous in COLLECTIONS and segment and segment not in COLLECTIONS:
+            templated.append('{%s}' % previous)
+            owner = previous == 'repos'
+        else:
+            templated.append(segment)
+    return '/'.join(templated)
+
+def record( method, url, status, size, latency, retries ):
+    if not ENABLED:
+        return
+    call = {
+        'method': method,
+        'host': urllib.parse.urlsplit(url).netloc,
+        'endpoint': endpoint(url),
+        'status': status,
+        'bytes': size,
+        'latency': round(latency, 4),
+        'retries': retries,
+        'phase': current_phase(),
+        'thread': threading.current_thread().name,
+        'at': round(time.monotonic() - _started, 4)
+    }
+    with _calls_lock:
+        _calls.append(call)
+
+def summarize():
+    groups = collections.OrderedDict()
+    with _calls_lock:
+        calls = list(_calls)
+    for call in calls:
+        key = ( call['phase'], call['method'], call['endpoint'] )
+        group = groups.setdefault(key, { 'phase': key[0], 'method': key[1], 'endpoint': key[2], 'calls': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.0, 'max': 0.0 })
+        group['calls'] += 1
+        group['errors'] += 1 if call['status'] >= 400 else 0
+        group['retries'] += call['retries']
+        group['bytes'] += call['bytes']
+        group['seconds'] += call['latency']
+        group['max'] = max( group['max'], call['latency'] )
+    return sorted(groups.values(), key=lambda x: -x['seconds'])
+
+def report():
+    summary = summarize()
+    total = sum( x['seconds'] for x in summary )
+    log.info( "API calls: %d, %.1fs in API calls, %.1fs wall time" % (sum(x['calls'] for x in summary), total, time.monotonic() - _started) )
+    log.info( "%-10s %-6s %-55s %6s %5s %5s %10s %8s %7s" % ('phase', 'method', 'endpoint', 'calls', 'errs', 'retry', 'bytes', 'seconds', 'max') )
+    for x in summary:
+        log.info( "%-10s %-6s %-55s %6d %5d %5d %10d %8.2f %7.2f" % (x['phase'][:10], x['method'], x['endpoint'][:55], x['calls'], x['errors'], x['retries'], x['bytes'], x['seconds'], x['max']) )
+    if TRACE_FILE:
+        with _calls_lock:
+            calls = list(_calls)
+        with open(TRACE_FILE, 'w', encoding='utf-8') as trace_file:
+            json.dump({ 'argv': sys.argv, 'calls': calls, 'summary': summary }, trace_file, indent=2)
+        log.info( "Wrote trace of %d calls to %s" % (len(calls), TRACE_FILE) )
+
+if ENABLED:
+    atexit.register(report)
+
+# Profiling ####################################################################
+
+def _start_cprofile():
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    def stop():
+        profiler.disable()
+        path = os.environ.get('PROFILE_FILE', 'review-envs.prof')
+        profiler.dump_stats(path)
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats('cumulative').print_stats(25)
+        log.info( stats.getvalue() )
+        log.info( "Wrote cProfile stats to %s" % path )
+    atexit.register(stop)
+
+def _start_sampler():
+    stacks = collections.Counter()
+    stopped = threading.Event()
+    me = []
+    def sample():
+        me.append(threading.get_ident())
+        while not stopped.wait(PROFILE_INTERVAL):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me[0]:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append('%s (%s:%d)' % (frame.f_code.co_name, os.path.basename(frame.f_code.co_filename), frame.f_code.co_firstlineno))
+                    frame = frame.f_back
+                stacks[';'.join(reversed(stack))] += 1
+    sampler = threading.Thread(target=sample, name='review-envs-sampler', daemon=True)
+    sampler.start()
+    def stop():
+        stopped.set()
+        sampler.join()
+        path = os.environ.get('PROFILE_FILE', 'review-envs.folded')
+        with open(path, 'w', encoding='utf-8') as profile_file:
+            for stack, count in stacks.most_common():
+                profile_file.write('%s %d\n' % (stack, count))
+        leaves = collections.Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        log.info( "Top sampled frames (%d samples):" % sum(stacks.values()) )
+        for leaf, count in leaves.most_common(15):
+            log.info( "%6d %s" % (count, leaf) )
+        log.info( "Wrote folded stacks to %s" % path )
+    atexit.register(stop)
+
+if PROFILE == 'cprofile':
+    _start_cprofile()
+elif PROFILE == 'sample':
+    _start_sampler()
@@ -0,0 +1,42 @@
+# Polling with exponential backoff and jitter under an overall deadline.
+
+import random
+import time
+
+from review_envs import log
+from review_envs import trace
+
+DEFAULT_DEADLINE = 20 * 60
+DEFAULT_INITIAL = 2
+DEFAULT_MAXIMUM = 30
+DEFAULT_FACTOR = 1.5
+DEFAULT_JITTER = 0.25
+
+class WaitTimeout(Exception):
+    pass
+
+def wait_for( poll, done, description, deadline=DEFAULT_DEADLINE, initial=DEFAULT_INITIAL, maximum=DEFAULT_MAXIMUM, factor=DEFAULT_FACTOR, jitter=DEFAULT_JITTER ):
+    # Calls poll() until done(result) is true and returns that result. The
+    # delay between polls starts at `initial` seconds and grows by `factor` up
+    # to `maximum`, randomized by +/- `jitter` so parallel waiters don't poll in
+    # lockstep. Raises WaitTimeout once `deadline` seconds have passed.
+    with trace.phase('wait'):
+        return _wait_for( poll, done, description, deadline, initial, maximum, factor, jitter )
+
+def _wait_for( poll, done, description, deadline, initial, maximum, factor, jitter ):
+    start = time.monotonic()
+    delay = initial
+    attempt = 0
+    while True:
+        attempt += 1
+        result = poll()
+        if done(result):
+            log.info( "%s: done after %.1fs (%d polls)" % (description, time.monotonic() - start, attempt) )
+            return result
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            raise WaitTimeout( "Timed out after %ds waiting for %s." % (deadline, description) )
+        sleep = min( delay * random.uniform(1 - jitter, 1 + jitter), maximum, remaining )
+        log.info( "%s: waiting %.1fs..." % (description, sleep) )
+        time.sleep(sleep)
+        delay = min( delay * factor, maximum )
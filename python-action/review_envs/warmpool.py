@@ -0,0 +1,97 @@
+# Warm pools of pre-built related apps, shared by the create and pool commands.
+#
+# A pool app is a related app that has been created, built and attached to its
+# pipeline ahead of time, under a placeholder name:
+#
+#   {APP_PREFIX}-{APP_NAME}-pr-pool-{6 hex key}{4 hex digits}
+#
+# {APP_PREFIX}-{APP_NAME} is cut to fit Heroku's 30 characters, so two related
+# apps can share it - the key, a hash of the uncut prefix and app name, is
+# what tells their pools apart. The -pr- keeps the delete guard in heroku.delete_app() working, and since no
+# PR number follows it, the reaper and destroy never take these apps for a
+# review environment. Claiming one is a rename to the environment's app name,
+# which takes seconds where creating the app takes minutes.
+
+import calendar
+import concurrent.futures
+import hashlib
+import json
+import re
+import secrets
+import time
+
+from review_envs import client
+from review_envs import heroku
+from review_envs import log
+from review_envs import trace
+
+POOL_INFIX = '-pr-pool-'
+POOL_WORKERS = 8
+
+def get_pool_base( prefix, app_short_name ):
+    # {prefix}-{app}, cut to fit in 30 chars, then the pool's own key
+    name = "%s-%s" % ( prefix, app_short_name )
+    key = hashlib.sha1(name.encode('utf-8')).hexdigest()[:6]
+    return name[:30 - len(POOL_INFIX) - 10] + POOL_INFIX + key
+
+def new_pool_app_name( prefix, app_short_name ):
+    return get_pool_base( prefix, app_short_name ) + secrets.token_hex(2)
+
+def get_pool_apps( apps, prefix, app_short_name ):
+    # the pool apps of app_short_name among a team's apps
+    pattern = re.compile( r'^%s[0-9a-f]{4}$' % re.escape(get_pool_base( prefix, app_short_name )) )
+    return [ x for x in apps if pattern.match(x['name']) ]
+
+def get_age( app ):
+    # seconds since the app was created
+    created = calendar.timegm( time.strptime( app['created_at'], '%Y-%m-%dT%H:%M:%SZ' ) )
+    return time.time() - created
+
+def get_pool_slugs( pool_apps, headers ):
+    # {app name: current slug or None} - no slug yet means the app is still building
+    with concurrent.futures.ThreadPoolExecutor(max_workers=POOL_WORKERS) as pool:
+        get_slug = trace.propagate( heroku.get_current_slug )
+        slugs = pool.map( lambda x: get_slug( x['id'], headers ), pool_apps )
+        return dict(zip( [ x['name'] for x in pool_apps ], slugs ))
+
+def claim( pool_app, app_name, headers ):
+    # Renames a pool app to app_name. The rename goes to the pool name rather
+    # than the id, so only one run can win it - once renamed, the pool name is
+    # gone and everyone else gets a 404 and moves on to the next pool app.
+    return heroku.rename_app( pool_app['name'], app_name, headers )
+
+def fill( count, prefix, app_short_name, team, pipeline_id, source_code_tgz, commit_sha, config_vars, headers ):
+    # Starts `count` app-setups for new pool apps and attaches each to the
+    # pipeline as a development app. Heroku builds them in the background, so
+    # this doesn't wait. Returns the names of the apps started.
+    def start( name ):
+        payload = {
+            'source_blob': {
+                'url': source_code_tgz,
+                'version': commit_sha,
+            },
+            'app': {
+                'name': name,
+                'organization': team
+            },
+            'overrides': {
+                'env': dict(config_vars, HEROKU_APP_NAME=name)
+            },
+            'skip_rollback': True
+        }
+        r = client.post( client.API_URL_HEROKU+'/app-setups', headers=headers, data=json.dumps(payload) )
+        app_setup = json.loads(r.text)
+        if 'id' not in app_setup:
+            log.warning( "Couldn't start pool app %s: %s" % (name, r.text[:200]) )
+            return None
+        payload = { 'app': app_setup['app']['id'], 'pipeline': pipeline_id, 'stage': 'development' }
+        r = client.post( client.API_URL_HEROKU+'/pipeline-couplings', headers=headers, data=json.dumps(payload) )
+        if r.status_code not in ( 200, 201 ):
+            log.warning( "Couldn't attach pool app %s to pipeline %s: %s" % (name, pipeline_id, r.text[:200]) )
+        return name
+    names = [ new_pool_app_name( prefix, app_short_name ) for _ in range(count) ]
+    if not names:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=POOL_WORKERS) as pool:
+        started = list(pool.map( trace.propagate( start ), names ))
+    return [ x for x in started if x ]
@@ -0,0 +1,122 @@
+# Runs the commands against review_envs.fakeapi on a free port and checks the
+# calls it recorded. Run from python-action/ with: python -m pytest -q
+
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENVIRONMENT = [
+    { 'APP_NAME': 'myapp', 'HEROKU_PIPELINE_NAME': 'myorg-myapp' },
+    { 'APP_NAME': 'rel', 'HEROKU_PIPELINE_NAME': 'myorg-myrelatedapp', 'REPO': 'myorg/myrelatedapp', 'BRANCH': 'master' }
+]
+
+# Helpers ######################################################################
+
+class Fake:
+
+    def __init__( self, *options ):
+        self.process = subprocess.Popen(
+            [ sys.executable, '-m', 'review_envs.fakeapi', '--port', '0', '--spawn-delay', '0.1', '--prs', '4', '--members', '2' ] + list(options),
+            cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True )
+        # "Fake Heroku/GitHub/Okta API on http://127.0.0.1:PORT"
+        self.url = self.process.stdout.readline().split()[-1]
+
+    def call( self, method, path, body=None ):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request( self.url + path, data=data, method=method )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def calls( self ):
+        return [ (x['method'], x['endpoint'], x['status']) for x in self.call('GET', '/__calls') ]
+
+    def reset( self ):
+        self.call('POST', '/__reset')
+
+    def run( self, command, *args, pr=4 ):
+        environ = dict(
+            os.environ,
+            API_URL_HEROKU=self.url,
+            API_URL_GITHUB=self.url,
+            HEROKU_API_TOKEN='heroku-token',
+            GITHUB_TOKEN='github-token',
+            GHA_USER_TOKEN='github-token',
+            GITHUB_REPOSITORY='myorg/myapp',
+            GITHUB_REF='refs/heads/feature-%d' % pr,
+            GITHUB_SHA='0' * 40,
+            PYTHONPATH=ROOT )
+        for name in ( 'HTTP_CACHE_DIR', 'OKTA_API_URL', 'GITHUB_EVENT_PATH', 'LOG_FORMAT', 'TRACE_FILE' ):
+            environ.pop(name, None)
+        return subprocess.run(
+            [ sys.executable, '-m', 'review_envs', command ] + list(args),
+            cwd=ROOT, env=environ, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=120 )
+
+    def stop( self ):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+@pytest.fixture
+def fake():
+    fake = Fake()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def environment_file( tmp_path ):
+    path = tmp_path / 'environment.json'
+    path.write_text(json.dumps(ENVIRONMENT))
+    return str(path)
+
+# Tests ########################################################################
+
+def test_create_makes_the_review_app_and_its_related_app( fake, environment_file ):
+    result = fake.run( 'create', 'APP_PREFIX=rv', 'HEROKU_TEAM_NAME=review-team', 'ENVIRONMENT_FILE='+environment_file )
+    assert result.returncode == 0, result.stdout
+
+    calls = fake.calls()
+    assert ('POST', '/review-apps', 201) in calls
+    assert ('POST', '/app-setups', 202) in calls
+    # the review app is renamed into place
+    assert ('PATCH', '/apps/{app}', 200) in calls
+    apps = [ x['name'] for x in fake.call('GET', '/apps') ]
+    assert 'rv-myapp-pr-4' in apps
+    assert 'rv-myapp-pr-4-rel' in apps
+
+def test_create_redeploys_a_related_app_when_its_branch_moves( fake, environment_file ):
+    args = ( 'APP_PREFIX=rv', 'HEROKU_TEAM_NAME=review-team', 'ENVIRONMENT_FILE='+environment_file, 'REDEPLOY=true' )
+    assert fake.run( 'create', *args ).returncode == 0
+
+    # an unchanged branch is left alone
+    fake.reset()
+    assert fake.run( 'create', *args ).returncode == 0
+    assert not [ x for x in fake.calls() if x[:2] == ('POST', '/apps/{app}/builds') ]
+
+    # a push to it is built on the existing app - nothing is created
+    fake.call('PATCH', '/repos/myorg/myrelatedapp/git/refs/heads/master', { 'sha': '1' * 40 })
+    fake.reset()
+    result = fake.run( 'create', *args )
+    assert result.returncode == 0, result.stdout
+    calls = fake.calls()
+    assert ('POST', '/apps/{app}/builds', 201) in calls
+    assert not [ x for x in calls if x[0] == 'POST' and x[1] in ( '/review-apps', '/app-setups', '/teams/apps' ) ]
+
+def test_throttled_calls_are_retried_then_returned():
+    fake = Fake( '--rate-limit-rate', '1', '--retry-after', '0' )
+    try:
+        result = fake.run( 'create', 'APP_PREFIX=rv', 'HEROKU_TEAM_NAME=review-team', 'APP_NAME=myapp', 'HEROKU_PIPELINE_NAME=myorg-myapp' )
+        assert result.returncode != 0
+        assert 'Rate limited on' in result.stdout
+
+        # each lookup is tried once and retried 5 times: the GraphQL prefetch,
+        # then the REST lookup it falls back to
+        calls = fake.calls()
+        assert calls == [ ('POST', '/graphql', 429) ] * 6 + [ ('GET', '/repos/{owner}/{repo}/pulls', 429) ] * 6
+    finally:
+        fake.stop()
@@ -7,5 +7,8 @@ shift
 
 ENV=$(for i in "$@"; do echo " -e $i"; done)
 
+# the action images build FROM the base image, which carries the shared
+# review_envs package - rebuild it so local changes are picked up
+docker build -t trrimages/actions:python python-action
 docker build -t $APP:latest $APP
 docker run $ENV -it $APP:latest